@@ -1,6 +1,7 @@
 import os
 import sys
 import signal
+import sqlite3
 import subprocess
 import platform
 
@@ -8,29 +9,64 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QTreeView, QTableView, Q
                              QFileSystemModel, QSplitter, QToolBar, QAction, QLabel, QFileDialog, 
                              QMenu, QProgressBar, QVBoxLayout, QWidget, QSizePolicy, 
                              QHBoxLayout, QLineEdit, QPushButton, QMessageBox)
-from PyQt5.QtCore import QDir, Qt, QUrl
-from PyQt5.QtGui import QIcon, QStandardItemModel, QDesktopServices
+from PyQt5.QtCore import QDir, Qt, QUrl, QTimer
+from PyQt5.QtGui import QIcon, QDesktopServices
 
 from alexandria_library.modules.proxy import CaseInsensitiveSortModel
+from alexandria_library.modules.results_model import SearchResultsModel, record_flags
 from alexandria_library.modules.worker  import FileWorker
+from alexandria_library.modules.watcher import LibraryWatcher
+from alexandria_library.modules.ocr_batch import OcrBatchWorker
+from alexandria_library.modules.metadata import MetadataHarvester
+from alexandria_library.modules.content_index import ContentIndex, ContentIndexer
+from alexandria_library.modules.duplicates import DuplicateWorker
+from alexandria_library.modules.bibtex import BibCache, set_rate_limit
+from alexandria_library.modules.bib_lookup import wait_bib_lookups, BibReviewQueue, BulkBibLookupWorker
+from alexandria_library.modules.bib_export import BibExportWorker
+from alexandria_library.modules.message import show_message
+from alexandria_library.modules.sidecar_store import set_store_root, read_bib, write_bib
+from alexandria_library.modules.search_index import get_search_index
+from alexandria_library.modules.query import refines, has_content_terms
+from alexandria_library.modules.query_cache import QueryCache
+from alexandria_library.modules.catalog import LibraryCatalog
 from alexandria_library.modules.files   import save_file_in
 from alexandria_library.modules.files   import open_file_from_index
 from alexandria_library.modules.files   import open_folder_from_path
 from alexandria_library.modules.context_menu   import show_context_menu_from_index
 from alexandria_library.modules.about_window   import show_about_window
 from alexandria_library.modules.search_results import display_search_results_from_file_list
+from alexandria_library.modules.search_results import clear_search_results
+from alexandria_library.modules.search_results import append_search_results_from_records
+from alexandria_library.modules.search_results import finish_search_results
+from alexandria_library.modules.search_results import file_flags
 from alexandria_library.desktop import create_desktop_file, create_desktop_directory, create_desktop_menu
 
 import alexandria_library.about as about
 import alexandria_library.modules.configure as configure 
 
-DEFAULT_CONTENT={"BASE_PATH":"~/Alexandria"}
+DEFAULT_CONTENT={"BASE_PATH":"~/Alexandria", "SEARCH_AS_YOU_TYPE": True, "QUERY_CACHE_SIZE": 32,
+                 "OCR_WORKERS": 0, "OCR_TIMEOUT": 60, "OCR_MEMORY_MB": 1024, "METADATA_WORKERS": 2,
+                 "CONTENT_INDEX": False, "CONTENT_WORKERS": 2, "CONTENT_MAX_PAGES": 200, "CONTENT_TIMEOUT": 60,
+                 "BIB_CACHE_DAYS": 30, "BIB_LOOKUP_WORKERS": 4, "BIB_LOOKUP_RATE": 1.0,
+                 "SIDECAR_STORE": False}
 
 # Caminho para o arquivo de configuração
 CONFIG_PATH = os.path.join(os.path.expanduser("~"),".config",about.__package__,"config.json")
 configure.verify_default_config(CONFIG_PATH, default_content=DEFAULT_CONTENT)
 CONFIG=configure.load_config(CONFIG_PATH)
 
+# Catálogo persistente dos arquivos da biblioteca
+CATALOG_PATH = os.path.join(os.path.dirname(CONFIG_PATH),"catalog.db")
+
+# Índice opcional do texto dos PDFs
+CONTENT_PATH = os.path.join(os.path.dirname(CONFIG_PATH),"content.db")
+
+# Respostas já recebidas da busca de dados bib
+BIB_CACHE_PATH = os.path.join(os.path.dirname(CONFIG_PATH),"bib_cache.db")
+
+# Rascunhos de arquivos .bib da busca em lote, à espera de revisão
+BIB_DRAFTS_PATH = os.path.join(os.path.dirname(CONFIG_PATH),"bib_drafts.jsonl")
+
 
 def open_filepath(path_arquivo: str):
     """
@@ -63,6 +99,39 @@ class Alexandria(QMainWindow):
         self.setWindowTitle(about.__program_name__)
         self.setGeometry(50, 100, 1100, 600)
         self.current_file_model = None
+        self.check_sidecars = False
+        self.worker = None
+        self.worker_pending = False     # resultados do worker ainda por chegar
+        self.old_workers = set()    # workers cancelados ainda em execução
+        self.watcher = None
+        self.ocr_worker = None
+        self.harvester = None
+        self.content_indexer = None
+        self.duplicate_worker = None
+        
+        # Raiz e texto da busca (None numa listagem) dos resultados mostrados
+        self.shown_root = None
+        self.shown_query = None
+        
+        # Última busca concluída: (raiz, texto, caminhos encontrados, geração)
+        self.last_search = None
+        self.found_records = []
+        
+        # Arquivo único com os dados dos .bib/.json, opcional
+        if CONFIG.get("SIDECAR_STORE", False):
+            set_store_root(os.path.expanduser(CONFIG["BASE_PATH"]))
+
+        # Cache das buscas, invalidado pela geração (sequência) do catálogo
+        self.catalog = LibraryCatalog(CATALOG_PATH)
+        self.query_cache = QueryCache(CONFIG.get("QUERY_CACHE_SIZE", 32))
+        self.search_generation = 0
+        
+        # Cache das buscas de dados bib (uma conexão por thread)
+        self.bib_cache = BibCache(BIB_CACHE_PATH, ttl=CONFIG.get("BIB_CACHE_DAYS", 30) * 24 * 3600)
+        set_rate_limit(CONFIG.get("BIB_LOOKUP_RATE", 1.0))
+        self.bib_queue = BibReviewQueue(BIB_DRAFTS_PATH)
+        self.bib_worker = None
+        self.export_worker = None
         
         # Icon
         base_dir_path = os.path.dirname(os.path.abspath(__file__))
@@ -85,12 +154,22 @@ class Alexandria(QMainWindow):
         # True, os arquivos não correspondentes seriam desabilitados, mas ainda visíveis
 
         # Modelo para todos os arquivos (recursivo)
-        self.all_files_model = QStandardItemModel()
+        self.all_files_model = SearchResultsModel(os.path.expanduser(CONFIG["BASE_PATH"]))
+        self.all_files_model.bib_lookup = get_search_index(CATALOG_PATH).bib_text
+        self.all_files_model.kind_lookup = get_search_index(CATALOG_PATH).file_kind
+        
+        # Busca no conteúdo dos PDFs (content:...), se habilitada
+        self.content_index = None
+        if CONFIG.get("CONTENT_INDEX", False):
+            self.content_index = ContentIndex(CONTENT_PATH)
+            get_search_index(CATALOG_PATH).content_lookup = self.content_index.lookup
 
         # Configuração da interface
         self.init_ui()
         self.create_toolbar()
         self.create_statusbar()
+        # Os PDFs são lidos depois da primeira varredura do watcher
+        self.start_watcher()
 
     def init_ui(self):
         # Widgets principais
@@ -148,17 +227,42 @@ class Alexandria(QMainWindow):
 
         # Filtro de busca
         self.search_box = QLineEdit()
-        self.search_box.setPlaceholderText("Search in file names and *.bib files...")
+        self.search_box.setPlaceholderText('Search in file names and *.bib files... (e.g. author:knuth year:>=2010 title:"logic")')
         self.search_box.returnPressed.connect(self.start_search)
+        # Busca enquanto digita, com debounce
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.start_search)
+        if CONFIG.get("SEARCH_AS_YOU_TYPE", True):
+            self.search_box.textChanged.connect(self.search_timer.start)
         search_button = QPushButton("Search")
         search_button.clicked.connect(self.start_search)
         clear_button = QPushButton("Clean")
         clear_button.clicked.connect(self.clear_search)
 
+        # Filtro rápido sobre os resultados já carregados (sem acessar o disco)
+        self.filter_box = QLineEdit()
+        self.filter_box.setPlaceholderText("Filter loaded results...")
+        self.filter_box.setClearButtonEnabled(True)
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(self.apply_quick_filter)
+        self.filter_box.textChanged.connect(self.filter_timer.start)
+        
+        # Leitura dos metadados dos PDFs novos ou modificados, agrupada
+        self.harvest_timer = QTimer(self)
+        self.harvest_timer.setSingleShot(True)
+        self.harvest_timer.setInterval(5000)
+        self.harvest_timer.timeout.connect(self.start_harvester)
+        self.harvest_timer.timeout.connect(self.start_content_indexer)
+
         search_layout = QHBoxLayout()
         search_layout.addWidget(self.search_box)
         search_layout.addWidget(search_button)
         search_layout.addWidget(clear_button)
+        search_layout.addWidget(self.filter_box)
 
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0) #self.progress_bar.setVisible(False)
@@ -190,6 +294,36 @@ class Alexandria(QMainWindow):
         self.refresh_action.triggered.connect(self.refresh)
         self.refresh_action.setToolTip("Refresh the information of all files in the library directory.")
         self.toolbar.addAction(self.refresh_action)
+        
+        #
+        self.verify_ocr_action = QAction(QIcon.fromTheme('insert-text'), "Verify OCR", self)
+        self.verify_ocr_action.triggered.connect(self.verify_ocr_folder)
+        self.verify_ocr_action.setToolTip("Verify the OCR of all PDFs in the selected directory (click again to stop).")
+        self.toolbar.addAction(self.verify_ocr_action)
+
+        #
+        self.fetch_bibs_action = QAction(QIcon.fromTheme('system-search'), "Fetch bibs", self)
+        self.fetch_bibs_action.triggered.connect(self.fetch_bib_drafts)
+        self.fetch_bibs_action.setToolTip("Search the bib data of all files without bib file in the selected directory, as drafts to review (click again to stop).")
+        self.toolbar.addAction(self.fetch_bibs_action)
+
+        #
+        self.review_bibs_action = QAction(QIcon.fromTheme('text-x-generic'), "Review bibs", self)
+        self.review_bibs_action.triggered.connect(self.review_bib_drafts)
+        self.review_bibs_action.setToolTip("Review the bib drafts found by \"Fetch bibs\" and save the accepted ones.")
+        self.toolbar.addAction(self.review_bibs_action)
+
+        #
+        self.export_bib_action = QAction(QIcon.fromTheme('document-save-as'), "Export bib", self)
+        self.export_bib_action.triggered.connect(self.export_bib_file)
+        self.export_bib_action.setToolTip("Export the bib files of the selected directory to a single bib file.")
+        self.toolbar.addAction(self.export_bib_action)
+
+        #
+        self.duplicates_action = QAction(QIcon.fromTheme('edit-find'), "Duplicates", self)
+        self.duplicates_action.triggered.connect(self.find_duplicates)
+        self.duplicates_action.setToolTip("List the duplicated files in the selected directory (click again to stop).")
+        self.toolbar.addAction(self.duplicates_action)
 
         # Adicionar o espaçador
         spacer = QWidget()
@@ -260,19 +394,346 @@ class Alexandria(QMainWindow):
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         
-        self.worker = FileWorker(directory, list_all=True)
+        self.stop_worker()
+        clear_search_results(self, os.path.expanduser(CONFIG["BASE_PATH"]))
+        self.last_search = None
+        self.shown_root = directory
+        self.shown_query = None
+        
+        self.worker = FileWorker(directory, list_all=True, catalog_path=CATALOG_PATH, streaming=True, 
+                                 check_sidecars=self.check_sidecars, check_files=self.check_sidecars)
+        self.check_sidecars = False
         self.worker.progress_updated.connect(self.update_progress)
-        self.worker.directory_files_found.connect(self.display_search_results)
+        self.worker.files_batch_found.connect(self.append_search_results)
+        self.worker.scan_finished.connect(self.finish_search_results)
+        self.worker.finished.connect(self.worker_finished)
+        self.worker_pending = True
         self.worker.start()
 
     def add_file(self):
         save_file_in(self,os.path.expanduser(CONFIG["BASE_PATH"]),self.refresh)
 
 
+    def sidecar_changed(self, file_path):
+        """
+        Registers in the catalog that the .bib/.json of file_path changed, 
+        which also invalidates the cached search results, and updates only 
+        the row of file_path in the open table.
+
+        Both sidecars are written in a single short transaction; a rescan 
+        commits every few directories, so it doesn't hold the GUI thread.
+        """
+        try:
+            self.catalog.update_bib(file_path, commit=False)
+            self.catalog.update_ocr(file_path, commit=False)
+            self.catalog.commit()
+            # O texto do .bib entra no índice antes do filtro rápido relê-lo
+            get_search_index(CATALOG_PATH).sync(self.catalog)
+        except sqlite3.OperationalError as e:
+            # O watcher registra a mudança no próximo varrimento
+            self.catalog.rollback()
+            print(f"Erro ao atualizar o catálogo: {e}")
+
+        state = self.catalog.file_state(file_path)
+        flags = record_flags(*state) if state is not None else file_flags(file_path)
+        self.all_files_model.update_record(file_path, flags)
+
+    def start_watcher(self):
+        """(Re)starts the background watcher of the library directory."""
+        self.stop_watcher()
+        self.watcher = LibraryWatcher(os.path.expanduser(CONFIG["BASE_PATH"]), CATALOG_PATH)
+        self.watcher.files_changed.connect(self.apply_library_changes)
+        self.watcher.library_scanned.connect(self.start_pdf_jobs)
+        self.watcher.start()
+
+    def stop_watcher(self):
+        if self.watcher is not None and self.watcher.isRunning():
+            self.watcher.cancel()
+            self.watcher.wait()
+
+    def start_pdf_jobs(self):
+        """
+        Starts the PDF jobs once the watcher has scanned the library: they
+        read the catalog it keeps up to date, instead of each one scanning
+        the whole library again at the same time.
+        """
+        if self.sender() is not self.watcher:
+            return
+        self.start_harvester()
+        self.start_content_indexer()
+
+    def start_harvester(self):
+        """Reads in background the metadata of the PDFs not read yet."""
+        if self.harvester is not None and self.harvester.isRunning():
+            # Os arquivos que chegarem durante a leitura ficam para a próxima
+            self.harvest_timer.start()
+            return
+        self.harvester = MetadataHarvester(os.path.expanduser(CONFIG["BASE_PATH"]), CATALOG_PATH, 
+                                           workers=CONFIG.get("METADATA_WORKERS", 2), rescan=False)
+        self.harvester.start()
+
+    def start_content_indexer(self):
+        """Indexes in background the text of the PDFs not indexed yet (if enabled)."""
+        if self.content_index is None:
+            return
+        if self.content_indexer is not None and self.content_indexer.isRunning():
+            self.harvest_timer.start()
+            return
+        self.content_indexer = ContentIndexer(os.path.expanduser(CONFIG["BASE_PATH"]), CATALOG_PATH, 
+                                              self.content_index, 
+                                              workers=CONFIG.get("CONTENT_WORKERS", 2), 
+                                              max_pages=CONFIG.get("CONTENT_MAX_PAGES", 200), 
+                                              timeout=CONFIG.get("CONTENT_TIMEOUT", 60), rescan=False)
+        self.content_indexer.start()
+
+    def stop_pdf_jobs(self):
+        """Stops the metadata harvester and the content indexer."""
+        self.harvest_timer.stop()
+        for worker in (self.harvester, self.content_indexer):
+            if worker is not None and worker.isRunning():
+                worker.cancel()
+                worker.wait()
+
+    def apply_library_changes(self, records, removed):
+        """
+        Applies to the open table the files created, modified or removed
+        in the library, as detected by the watcher.
+        """
+        if self.sender() is not self.watcher or self.shown_root is None:
+            return
+        model = self.all_files_model
+        prefix = os.path.join(os.path.normpath(self.shown_root), '')
+        records = [record for record in records if record[0].startswith(prefix)]
+        model.remove_paths(removed)
+        if not records:
+            return
+        if any(record[0].lower().endswith('.pdf') for record in records):
+            self.harvest_timer.start()
+
+        # Enquanto um worker preenche a tabela, ele mesmo traz os arquivos novos
+        # (até o seu scan_finished chegar: a thread termina antes dos sinais)
+        add_new = not self.worker_pending
+        if add_new and self.shown_query:
+            # Numa busca, só entram os arquivos novos que satisfazem a consulta
+            known = model.path_index()
+            new_paths = [record[0] for record in records if record[0] not in known]
+            matching = set(get_search_index(CATALOG_PATH).query(self.shown_query, self.shown_root,
+                                                                candidates=new_paths))
+            records = [record for record in records if record[0] in known or record[0] in matching]
+        model.update_records(records, add_new=add_new)
+
+    def verify_ocr_folder(self):
+        """Starts (or stops, if running) the OCR verification of the selected directory."""
+        if self.ocr_worker is not None and self.ocr_worker.isRunning():
+            self.ocr_worker.cancel()
+            self.statusBar().showMessage("Stopping the OCR verification...")
+            return
+
+        selected = self.tree_view.selectedIndexes()
+        if not selected:
+            root = os.path.expanduser(CONFIG["BASE_PATH"])
+        else:
+            root = self.dir_model.filePath(selected[0])
+
+        self.start_ocr_job(root)
+        self.statusBar().showMessage(f"Verifying the OCR of the PDFs in {root}...")
+
+    def verify_ocr_files(self, files):
+        """Starts (or stops, if running) the OCR verification of the given files, e.g. the selected rows."""
+        if self.ocr_worker is not None and self.ocr_worker.isRunning():
+            self.ocr_worker.cancel()
+            self.statusBar().showMessage("Stopping the OCR verification...")
+            return
+
+        self.start_ocr_job(os.path.expanduser(CONFIG["BASE_PATH"]), files)
+        self.statusBar().showMessage(f"Verifying the OCR of {len(files)} selected files...")
+
+    def start_ocr_job(self, root, files=None):
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.ocr_worker = OcrBatchWorker(root, CATALOG_PATH, 
+                                         workers=CONFIG.get("OCR_WORKERS", 0), 
+                                         timeout=CONFIG.get("OCR_TIMEOUT", 60), 
+                                         memory_limit_mb=CONFIG.get("OCR_MEMORY_MB", 1024),
+                                         files=files)
+        self.ocr_worker.progress_updated.connect(self.progress_bar.setValue)
+        self.ocr_worker.batch_written.connect(self.apply_ocr_batch)
+        self.ocr_worker.job_finished.connect(self.finish_ocr_folder)
+        self.ocr_worker.start()
+
+    def apply_ocr_batch(self, records):
+        self.all_files_model.update_records(records, add_new=False)
+
+    def finish_ocr_folder(self, checked, failed):
+        self.progress_bar.setValue(0)
+        message = f"OCR verified for {checked - failed} PDFs"
+        if failed:
+            message += f" ({failed} could not be checked)"
+        if self.ocr_worker is not None and self.ocr_worker.canceled:
+            message += "; stopped" if self.ocr_worker.files is not None else "; stopped, it will resume from here"
+        self.statusBar().showMessage(message)
+
+    def fetch_bib_drafts(self):
+        """Starts (or stops, if running) the bulk bib lookup of the selected directory."""
+        if self.bib_worker is not None and self.bib_worker.isRunning():
+            self.bib_worker.cancel()
+            self.statusBar().showMessage("Stopping the search of bib data...")
+            return
+
+        selected = self.tree_view.selectedIndexes()
+        if not selected:
+            root = os.path.expanduser(CONFIG["BASE_PATH"])
+        else:
+            root = self.dir_model.filePath(selected[0])
+
+        self.start_bib_job(root)
+        self.statusBar().showMessage(f"Searching the bib data of the files in {root}...")
+
+    def fetch_bib_files(self, files):
+        """Starts (or stops, if running) the bib lookup of the given files, e.g. the selected rows."""
+        if self.bib_worker is not None and self.bib_worker.isRunning():
+            self.bib_worker.cancel()
+            self.statusBar().showMessage("Stopping the search of bib data...")
+            return
+
+        self.start_bib_job(os.path.expanduser(CONFIG["BASE_PATH"]), files)
+        self.statusBar().showMessage(f"Searching the bib data of {len(files)} selected files...")
+
+    def start_bib_job(self, root, files=None):
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.bib_worker = BulkBibLookupWorker(root, CATALOG_PATH, self.bib_queue, cache=self.bib_cache,
+                                              workers=CONFIG.get("BIB_LOOKUP_WORKERS", 4), files=files)
+        self.bib_worker.progress_updated.connect(self.progress_bar.setValue)
+        self.bib_worker.job_finished.connect(self.finish_bib_drafts)
+        self.bib_worker.start()
+
+    def finish_bib_drafts(self, queued, not_found, failed):
+        self.progress_bar.setValue(0)
+        message = f"{queued} bib drafts to review ({len(self.bib_queue)} in total), {not_found} files without result"
+        if failed:
+            message += f", {failed} searches failed"
+        if self.bib_worker is not None and self.bib_worker.canceled:
+            message += "; stopped"
+        self.statusBar().showMessage(message)
+
+    def review_bib_drafts(self):
+        """
+        Shows the bib drafts one by one: Save writes the (edited) .bib file,
+        Discard drops the draft, Close stops the review keeping the rest.
+        """
+        if self.bib_worker is not None and self.bib_worker.isRunning():
+            self.statusBar().showMessage("Wait for (or stop) the search of bib data before the review")
+            return
+        entries = self.bib_queue.entries()
+        reviewed = []
+        try:
+            for number, entry in enumerate(entries, 1):
+                file_path = entry["path"]
+                if not os.path.exists(file_path) or read_bib(file_path) is not None:
+                    reviewed.append(file_path)      # arquivo removido ou já com .bib
+                    continue
+                res = show_message( entry["bibtex"], 
+                                    width=600, 
+                                    height=300, 
+                                    read_only=False, 
+                                    ok_label='Save',
+                                    title=f"Bib draft {number}/{len(entries)}: {os.path.basename(file_path)}",
+                                    show_close_button=True,
+                                    show_discard_button=True)
+                if res == '':
+                    break
+                reviewed.append(file_path)
+                if res is not None:
+                    write_bib(file_path, res)
+                    self.sidecar_changed(file_path)
+        finally:
+            if reviewed:
+                self.bib_queue.remove(reviewed)
+        self.statusBar().showMessage(f"{len(self.bib_queue)} bib drafts left to review")
+
+    def export_bib_file(self):
+        """Exports the bib files of the selected directory to one bib file chosen by the user."""
+        if self.export_worker is not None and self.export_worker.isRunning():
+            self.statusBar().showMessage("An export is already running...")
+            return
+
+        selected = self.tree_view.selectedIndexes()
+        if not selected:
+            root = os.path.expanduser(CONFIG["BASE_PATH"])
+        else:
+            root = self.dir_model.filePath(selected[0])
+
+        output_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export bib file",
+            os.path.join(os.path.expanduser("~"), os.path.basename(os.path.normpath(root)) + ".bib"),
+            "BibTeX (*.bib)"
+        )
+        if not output_path:
+            return
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.export_worker = BibExportWorker(root, CATALOG_PATH, output_path)
+        self.export_worker.progress_updated.connect(self.progress_bar.setValue)
+        self.export_worker.export_finished.connect(self.finish_bib_export)
+        self.export_worker.start()
+        self.statusBar().showMessage(f"Exporting the bib files of {root}...")
+
+    def finish_bib_export(self, entries, renamed):
+        self.progress_bar.setValue(0)
+        if entries < 0:
+            self.statusBar().showMessage("The bib export failed")
+            return
+        message = f"{entries} bib entries exported to {self.export_worker.output_path}"
+        if renamed:
+            message += f" ({renamed} repeated keys renamed)"
+        self.statusBar().showMessage(message)
+
+    def find_duplicates(self):
+        """Starts (or stops, if running) the search of duplicated files in the selected directory."""
+        if self.duplicate_worker is not None and self.duplicate_worker.isRunning():
+            self.duplicate_worker.cancel()
+            self.statusBar().showMessage("Stopping the search of duplicates...")
+            return
+
+        selected = self.tree_view.selectedIndexes()
+        if not selected:
+            root = os.path.expanduser(CONFIG["BASE_PATH"])
+        else:
+            root = self.dir_model.filePath(selected[0])
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.duplicate_worker = DuplicateWorker(root, CATALOG_PATH)
+        self.duplicate_worker.progress_updated.connect(self.progress_bar.setValue)
+        self.duplicate_worker.duplicates_found.connect(self.display_duplicates)
+        self.duplicate_worker.finished.connect(lambda: self.progress_bar.setValue(0))
+        self.duplicate_worker.start()
+        self.statusBar().showMessage(f"Looking for duplicated files in {root}...")
+
+    def display_duplicates(self, records, groups, wasted):
+        """Shows the duplicated files, group by group, with the Group column."""
+        self.stop_worker()
+        self.last_search = None
+        # A lista não é uma pasta nem uma busca: o watcher não acrescenta linhas
+        self.shown_root = None
+        self.shown_query = None
+        self.all_files_model.set_records(records, os.path.expanduser(CONFIG["BASE_PATH"]), groups)
+        finish_search_results(self, len(records))
+        self.table_view.sortByColumn(SearchResultsModel.COLUMN_GROUP, Qt.AscendingOrder)
+        self.table_view.setEnabled(True)
+        number_of_groups = groups[-1] + 1 if groups else 0
+        self.statusBar().showMessage(f"{number_of_groups} groups of duplicated files, "
+                                     f"{wasted / (1024 * 1024):.1f} MB wasted")
+
     def refresh(self):
         self.dir_model.setRootPath("")  # Força atualização
         self.dir_model.setRootPath(os.path.expanduser(CONFIG["BASE_PATH"]))
         self.tree_view.setRootIndex(self.dir_model.index(os.path.expanduser(CONFIG["BASE_PATH"])))
+        # Verifica também os arquivos (e .bib) reescritos sem mudar o diretório
+        self.check_sidecars = True
         self.on_tree_selection_changed()
        
     def change_base_path(self,new_path):
@@ -281,6 +742,10 @@ class Alexandria(QMainWindow):
             #self.tree_view.selectionModel().clearSelection()
             
             CONFIG["BASE_PATH"] = str(new_path)
+            if CONFIG.get("SIDECAR_STORE", False):
+                self.stop_watcher()
+                self.stop_pdf_jobs()
+                set_store_root(os.path.expanduser(CONFIG["BASE_PATH"]))
             
             self.basepath_box.setText(os.path.expanduser(CONFIG["BASE_PATH"]))
 
@@ -288,11 +753,13 @@ class Alexandria(QMainWindow):
             self.tree_view.setModel(self.dir_model)
             self.tree_view.setRootIndex(self.dir_model.index(os.path.expanduser(CONFIG["BASE_PATH"])))
             
-            model = QStandardItemModel()  
-            model.clear()  
+            self.all_files_model.clear(os.path.expanduser(CONFIG["BASE_PATH"]))
             self.proxy_model = CaseInsensitiveSortModel()
-            self.proxy_model.setSourceModel(model)
+            self.proxy_model.setSourceModel(self.all_files_model)
             self.table_view.setModel(self.proxy_model) 
+            self.shown_root = None
+            self.stop_pdf_jobs()
+            self.start_watcher()
 
     def basepath_box_pressed(self):
         new_path = self.basepath_box.text()
@@ -318,6 +785,25 @@ class Alexandria(QMainWindow):
     def show_context_menu(self, pos):
         show_context_menu_from_index(self, os.path.expanduser(CONFIG["BASE_PATH"]), pos)
 
+    def stop_worker(self):
+        """
+        Cancels the running worker, if any, without waiting for its thread
+        (it may be loading the search index, which can't be interrupted):
+        its signals are disconnected and it is kept until it finishes.
+        """
+        self.search_timer.stop()
+        self.worker_pending = False
+        worker = self.worker
+        if worker is not None and worker.isRunning():
+            worker.cancel()
+            for signal_ in (worker.progress_updated, worker.files_batch_found, worker.scan_finished):
+                try:
+                    signal_.disconnect()
+                except TypeError:
+                    pass
+            self.old_workers.add(worker)
+            worker.finished.connect(lambda: self.old_workers.discard(worker))
+
     def start_search(self):
         search_text = self.search_box.text().strip()
         if not search_text:
@@ -329,21 +815,87 @@ class Alexandria(QMainWindow):
         else:
             search_root = self.dir_model.filePath(selected[0])
 
+        self.stop_worker()
+        generation = self.catalog.sequence()
+        if has_content_terms(search_text):
+            # Só as buscas no conteúdo dependem do índice de conteúdo
+            generation = (generation, self.catalog.content_sequence())
+
+        # Se a busca anterior contém esta, basta filtrar os seus resultados
+        candidates = None
+        if self.last_search is not None:
+            last_root, last_text, last_paths, last_generation = self.last_search
+            if last_root == search_root and last_generation == generation and \
+               refines(last_text, search_text):
+                candidates = last_paths
+
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
 
-        self.worker = FileWorker(search_root, search_text)
+        clear_search_results(self, os.path.expanduser(CONFIG["BASE_PATH"]))
+        self.last_search = None
+        self.found_records = []
+        self.shown_root = search_root
+        self.shown_query = search_text
+
+        self.search_generation = generation
+        cached = self.query_cache.get(search_root, search_text, generation)
+        if cached is not None:
+            append_search_results_from_records(self, cached)
+            self.last_search = (search_root, search_text, [record[0] for record in cached], generation)
+            finish_search_results(self, len(cached))
+            self.table_view.setEnabled(True)
+            return
+
+        self.worker = FileWorker(search_root, search_text, catalog_path=CATALOG_PATH, streaming=True, 
+                                 candidates=candidates)
         self.worker.progress_updated.connect(self.update_progress)
-        self.worker.search_complete.connect(self.display_search_results)
+        self.worker.files_batch_found.connect(self.append_search_results)
+        self.worker.scan_finished.connect(self.finish_search_results)
+        self.worker.finished.connect(self.worker_finished)
+        self.worker_pending = True
         self.worker.start()
 
+    def worker_finished(self):
+        # Emitido depois de todos os sinais do worker, mesmo se ele falhou
+        if self.sender() is self.worker:
+            self.worker_pending = False
+
     def update_progress(self, value):
+        # Ignora sinais ainda na fila de um worker já cancelado
+        if self.sender() is not self.worker:
+            return
         self.progress_bar.setValue(value)
 
     def display_search_results(self, file_list):
         display_search_results_from_file_list(self, os.path.expanduser(CONFIG["BASE_PATH"]), file_list)
         self.table_view.setEnabled(True)
 
+    def append_search_results(self, records):
+        if self.sender() is not self.worker:
+            return
+        if self.worker.search_text:
+            self.found_records.extend(records)
+        append_search_results_from_records(self, records)
+
+    def finish_search_results(self, number_of_files):
+        worker = self.sender()
+        if worker is not self.worker:
+            return
+        if worker.search_text and not worker.canceled:
+            self.last_search = (worker.root_dir, worker.search_text, 
+                                [record[0] for record in self.found_records], 
+                                self.search_generation)
+            self.query_cache.put(worker.root_dir, worker.search_text, 
+                                 self.search_generation, self.found_records)
+        finish_search_results(self, number_of_files)
+        self.table_view.setEnabled(True)
+
+    def apply_quick_filter(self):
+        self.proxy_model.set_quick_filter(self.filter_box.text())
+        model = self.all_files_model
+        self.statusBar().showMessage(f"{model.rowCount()} of {model.total_count()} files shown")
+
     def clear_search(self):
         self.search_box.clear()
         self.progress_bar.setValue(0) #self.progress_bar.setVisible(False)
@@ -363,9 +915,25 @@ class Alexandria(QMainWindow):
                 tray_icon.showMessage("⚠️ " + title + " ⚠️", message, QSystemTrayIcon.Information, 3000)
 
     def closeEvent(self, event):
-        if hasattr(self, 'worker') and self.worker.isRunning():
-            self.worker.cancel()
-            self.worker.wait()
+        self.stop_worker()
+        for worker in list(self.old_workers):
+            worker.wait()
+        self.stop_watcher()
+        self.stop_pdf_jobs()
+        if self.ocr_worker is not None and self.ocr_worker.isRunning():
+            self.ocr_worker.cancel()
+            self.ocr_worker.wait()
+        if self.duplicate_worker is not None and self.duplicate_worker.isRunning():
+            self.duplicate_worker.cancel()
+            self.duplicate_worker.wait()
+        if self.bib_worker is not None and self.bib_worker.isRunning():
+            self.bib_worker.cancel()
+            self.bib_worker.wait()
+        if self.export_worker is not None and self.export_worker.isRunning():
+            self.export_worker.cancel()
+            self.export_worker.wait()
+        wait_bib_lookups()
+        self.catalog.close()
         event.accept()
 
 def main():
@@ -0,0 +1,145 @@
+import os
+import re
+import sqlite3
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from alexandria_library.modules.bibtex import iter_bibtex_entries
+from alexandria_library.modules.catalog import LibraryCatalog
+
+# Caracteres aceitos numa chave de citação
+KEY_INVALID_RE = re.compile(r"[\s,{}()\"#%'=\\~]+")
+
+def _key_suffix(n):
+    # a, b, ..., z, aa, ab, ...
+    suffix = ""
+    while True:
+        suffix = chr(ord('a') + n % 26) + suffix
+        n = n // 26 - 1
+        if n < 0:
+            return suffix
+
+class KeyDeduplicator:
+    """
+    Gives each entry of a bibliography a unique citation key: the first
+    entry keeps its key, the following entries with the same key get the
+    suffixes a, b, c... (e.g. Donald1997, Donald1997a), as usual in BibTeX.
+    """
+
+    def __init__(self):
+        self.used = set()
+        self.next_suffix = {}   # key -> next suffix number to try
+        self.renamed = 0
+
+    def unique_key(self, key):
+        key = KEY_INVALID_RE.sub("", key) or "entry"
+        if key.lower() not in self.used:
+            self.used.add(key.lower())
+            return key
+        self.renamed += 1
+        n = self.next_suffix.get(key.lower(), 0)
+        while (key + _key_suffix(n)).lower() in self.used:
+            n += 1
+        self.next_suffix[key.lower()] = n + 1
+        new_key = key + _key_suffix(n)
+        self.used.add(new_key.lower())
+        return new_key
+
+def export_bibliography(catalog, root_dir, output_path, canceled=lambda: False, progress=None):
+    """
+    Writes one .bib file with the entries of all the .bib sidecars under
+    root_dir, in the order of the file paths, each entry preceded by a
+    comment with the relative path of its file ("@" written as "(at)"). Colliding citation keys
+    are rewritten (see KeyDeduplicator); @string and @preamble entries
+    are written once.
+
+    The sidecars are taken from the catalog, which only reads again the
+    ones whose mtime changed (see LibraryCatalog.rescan with
+    check_sidecars=True), and are streamed to the output: the whole
+    bibliography is never in memory. The output is written to a temporary
+    file and renamed at the end, so a canceled export leaves the previous
+    file untouched.
+
+    Parameters:
+    - catalog (LibraryCatalog): Catalog opened by the calling thread
+    - root_dir (str): Directory whose subtree is exported
+    - output_path (str): Path of the .bib file to write
+    - canceled (callable, optional): Returns True to stop
+    - progress (callable, optional): Called with (done, total) files
+
+    Returns:
+    - tuple: (number of entries, number of renamed keys), or None if canceled
+    """
+    root_dir = os.path.normpath(root_dir)
+    catalog.rescan(root_dir, canceled=canceled, check_sidecars=True)
+    total = catalog.count_bib_texts(root_dir)
+    keys = KeyDeduplicator()
+    written_strings = set()
+    entries = 0
+    tmp_path = output_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as saida:
+            for done, (path, text) in enumerate(catalog.iter_bib_texts(root_dir), 1):
+                if canceled():
+                    return None
+                # Fora das entradas, o BibTeX ignora o texto até o próximo "@"
+                saida.write(f"% {os.path.relpath(path, root_dir).replace('@', '(at)')}\n")
+                for entry_type, key, body in iter_bibtex_entries(text):
+                    if key is None:
+                        # @string/@preamble repetidos em vários arquivos
+                        if (entry_type, body) in written_strings:
+                            continue
+                        written_strings.add((entry_type, body))
+                        saida.write(f"@{entry_type}{{{body}}}\n\n")
+                        continue
+                    saida.write(f"@{entry_type}{{{keys.unique_key(key)},{body}}}\n\n")
+                    entries += 1
+                if progress is not None and done % 1000 == 0:
+                    progress(done, total)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return entries, keys.renamed
+
+class BibExportWorker(QThread):
+    """
+    Exports the .bib sidecars of a directory subtree to one .bib file
+    (see export_bibliography) outside the GUI thread.
+
+    Signals:
+    - progress_updated: Emits the percentage of exported files
+    - export_finished: Emits (number of entries, number of renamed keys),
+      (-1, 0) if canceled or on errors
+    """
+
+    progress_updated = pyqtSignal(int)
+    export_finished = pyqtSignal(int, int)
+
+    def __init__(self, root_dir, catalog_path, output_path):
+        super().__init__()
+        self.root_dir = os.path.normpath(root_dir)
+        self.catalog_path = catalog_path
+        self.output_path = output_path
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def run(self):
+        catalog = None
+        result = None
+        try:
+            catalog = LibraryCatalog(self.catalog_path)
+            result = export_bibliography(catalog, self.root_dir, self.output_path,
+                                         canceled=lambda: self.canceled,
+                                         progress=lambda done, total:
+                                             self.progress_updated.emit(int(100 * done / max(total, 1))))
+        except OSError as e:
+            print(f"Erro ao exportar {self.output_path}: {e}")
+        except sqlite3.OperationalError as e:
+            print(f"Erro ao ler o catálogo: {e}")
+        finally:
+            if catalog is not None:
+                catalog.close()
+            self.export_finished.emit(*(result if result is not None else (-1, 0)))
@@ -0,0 +1,309 @@
+import os
+import re
+import json
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from alexandria_library.modules.bibtex import get_bibtex_from_books, LookupCanceled
+from alexandria_library.modules.catalog import LibraryCatalog
+from alexandria_library.modules.pdfs import parse_metadata_json
+
+# Tentativas de cada busca em lote após erros temporários (429, 5xx, rede)
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Títulos de metadados que são só o nome do arquivo ou do programa de origem
+JUNK_TITLE_RE = re.compile(r"^(microsoft (word|powerpoint)|untitled|\S+\.(docx?|pdf|tex|dvi|ps|indd)$)", re.I)
+
+# Workers em execução: uma referência precisa ser mantida até o fim da thread
+_running = set()
+
+class BibLookupWorker(QThread):
+    """
+    Looks one book up in the books API (see bibtex.get_bibtex_from_books)
+    outside the GUI thread, so the window never waits for the network.
+
+    Signals:
+    - lookup_finished: Emits (query, bibtex, error); bibtex is None if
+      nothing was found or on errors, error is "" on success
+    """
+
+    lookup_finished = pyqtSignal(str, object, str)
+
+    def __init__(self, query, cache=None, url=None):
+        """
+        Parameters:
+        - query (str): Title (or words of the title) of the book
+        - cache (BibCache, optional): Answers cache
+        - url (str, optional): URL of the API. Defaults to bibtex.BOOKS_API_URL.
+        """
+        super().__init__()
+        self.query = query
+        self.cache = cache
+        self.url = url
+
+    def run(self):
+        try:
+            bibtex = get_bibtex_from_books(self.query, cache=self.cache, url=self.url)
+            error = ""
+        except Exception as e:
+            # Erros de rede, respostas inesperadas da API, cache...
+            bibtex = None
+            error = str(e) or type(e).__name__
+        finally:
+            if self.cache is not None:
+                self.cache.close()
+        self.lookup_finished.emit(self.query, bibtex, error)
+
+def lookup_bibtex(query, callback, cache=None, url=None):
+    """
+    Starts the lookup of query in background and calls
+    callback(query, bibtex, error) in the GUI thread when it finishes.
+
+    Returns:
+    - BibLookupWorker: The started worker
+    """
+    worker = BibLookupWorker(query, cache=cache, url=url)
+    worker.lookup_finished.connect(callback)
+    worker.finished.connect(lambda: _running.discard(worker))
+    _running.add(worker)
+    worker.start()
+    return worker
+
+def wait_bib_lookups():
+    """Waits for the running lookups (e.g. before closing the program)."""
+    for worker in list(_running):
+        worker.wait()
+
+def query_from_file(file_path, metadata=None):
+    """
+    Returns the title query of a file: the /Title of its PDF metadata,
+    if meaningful, otherwise the basename without extension, bracketed
+    parts and "_"/"." separators.
+    """
+    title = " ".join((metadata or {}).get("/Title", "").split())
+    if len(title) >= 3 and not JUNK_TITLE_RE.match(title):
+        return title
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    name = re.sub(r"\([^)]*\)|\[[^\]]*\]", " ", name)
+    return " ".join(re.sub(r"[_.]+", " ", name).split())
+
+def _is_temporary(error):
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+class BibReviewQueue:
+    """
+    Drafts of .bib sidecars waiting to be reviewed, kept in a JSON lines
+    file ({"path", "query", "bibtex"} per line), so a bulk lookup never
+    writes over the library files. A draft becomes a .bib sidecar only
+    when accepted in the review.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.drafts = {}    # file path -> entry
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.drafts[entry["path"]] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue    # última linha incompleta
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self.drafts)
+
+    def __contains__(self, file_path):
+        return file_path in self.drafts
+
+    def entries(self):
+        """Returns the drafts, sorted by file path."""
+        return [self.drafts[path] for path in sorted(self.drafts)]
+
+    def add(self, entries):
+        """Appends dicts with "path", "query" and "bibtex" and syncs the file."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.drafts[entry["path"]] = entry
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self, paths):
+        """Removes drafts (e.g. reviewed ones), rewriting the file."""
+        for path in paths:
+            self.drafts.pop(path, None)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+class BulkBibLookupWorker(QThread):
+    """
+    Looks up in the books API the bib data of all the files of a
+    directory subtree without a .bib sidecar, outside the GUI thread.
+
+    The query of each file comes from its PDF metadata or its name (see
+    query_from_file). Up to workers lookups run at the same time, all of
+    them under the shared rate limit of the API (see
+    bibtex.set_rate_limit), so the throughput is bounded by the quota and
+    not by the round trips. Temporary errors (HTTP 429, 5xx, network) are
+    retried with exponential backoff (honoring Retry-After). The answers
+    go through the BibCache and the BibTeX found is added to a
+    BibReviewQueue; the files already queued are skipped.
+
+    A job can also be given a list of files instead (e.g. the rows selected
+    in the table): then the ones without a .bib sidecar are looked up and
+    their drafts are added to the queue in a single batch at the end (also
+    when canceled).
+
+    Signals:
+    - progress_updated: Emits the percentage of looked up files
+    - job_finished: Emits (number of drafts queued, number of files
+      without result, number of failed lookups)
+    """
+
+    progress_updated = pyqtSignal(int)
+    job_finished = pyqtSignal(int, int, int)
+
+    def __init__(self, root_dir, catalog_path, queue, cache=None, workers=4, url=None, files=None):
+        """
+        Parameters:
+        - root_dir (str): Directory whose subtree is looked up
+        - catalog_path (str): Path of the SQLite catalog
+        - queue (BibReviewQueue): Queue that receives the drafts; only used
+          by this thread while it runs
+        - cache (BibCache, optional): Answers cache
+        - workers (int, optional): Maximum number of simultaneous lookups
+        - url (str, optional): URL of the API. Defaults to bibtex.BOOKS_API_URL.
+        - files (list, optional): Paths of the files to look up instead of
+          the subtree of root_dir
+        """
+        super().__init__()
+        self.files = files
+        self.root_dir = os.path.normpath(root_dir)
+        self.catalog_path = catalog_path
+        self.queue = queue
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.url = url
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def _sleep(self, seconds):
+        # Espera interrompível pelo cancelamento
+        end = time.monotonic() + seconds
+        while not self.canceled and time.monotonic() < end:
+            time.sleep(max(0.0, min(0.2, end - time.monotonic())))
+
+    def _lookup(self, query):
+        """Returns the BibTeX of query (or None), retrying the temporary errors."""
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                return get_bibtex_from_books(query, cache=self.cache, url=self.url,
+                                             canceled=lambda: self.canceled)
+            except requests.RequestException as e:
+                if attempt == MAX_RETRIES or not _is_temporary(e) or self.canceled:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+                self._sleep(delay)
+            finally:
+                if self.cache is not None:
+                    self.cache.close()
+
+    def run(self):
+        queued = not_found = failed = 0
+        drafts = []
+        try:
+            catalog = LibraryCatalog(self.catalog_path)
+            try:
+                if self.files is None:
+                    catalog.rescan(self.root_dir, canceled=lambda: self.canceled)
+                    candidates = catalog.list_files_without_bib(self.root_dir)
+                else:
+                    candidates = [(path, info) for path, has_bib, _, info in catalog.list_files_info(self.files)
+                                  if not has_bib]
+                files = [(path, query_from_file(path, parse_metadata_json(info)))
+                         for path, info in candidates
+                         if path not in self.queue]
+            finally:
+                catalog.close()
+            tasks = [(path, query) for path, query in files if query]
+            total = len(tasks)
+
+            pending = list(reversed(tasks))
+            running = {}
+            done_count = 0
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                try:
+                    while (pending or running) and not self.canceled:
+                        while pending and len(running) < self.workers:
+                            path, query = pending.pop()
+                            running[executor.submit(self._lookup, query)] = (path, query)
+
+                        done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            path, query = running.pop(future)
+                            done_count += 1
+                            try:
+                                bibtex = future.result()
+                            except LookupCanceled:
+                                continue
+                            except Exception as e:
+                                # Erros de rede, respostas inesperadas da API, cache...
+                                print(f"Erro ao buscar os dados bib de {path}: {e}")
+                                failed += 1
+                                continue
+                            if bibtex is None:
+                                not_found += 1
+                            else:
+                                drafts.append({"path": path, "query": query, "bibtex": bibtex})
+                        # Uma seleção entra na fila de uma vez, no fim
+                        if drafts and self.files is None:
+                            self.queue.add(drafts)
+                            queued += len(drafts)
+                            drafts = []
+                        if done:
+                            self.progress_updated.emit(int(100 * done_count / total))
+                finally:
+                    for future in running:
+                        future.cancel()
+        except Exception as e:
+            print(f"Erro na busca dos dados bib de {self.root_dir}: {e}")
+        finally:
+            # Os rascunhos já encontrados não se perdem, e o fim é sempre avisado
+            if drafts:
+                try:
+                    self.queue.add(drafts)
+                    queued += len(drafts)
+                except OSError as e:
+                    print(f"Erro ao salvar os rascunhos bib: {e}")
+            self.job_finished.emit(queued, not_found, failed)
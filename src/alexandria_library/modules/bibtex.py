@@ -1,14 +1,245 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
 
-def get_bibtex_from_books(title_query):
-    url = "https://www.googleapis.com/books/v1/volumes"
-    params = {"q": f"intitle:{title_query}", "maxResults": 1}
-    r = requests.get(url, params=params, timeout=10)
-    r.raise_for_status()
-    data = r.json()
-    if "items" not in data or not data["items"]:
-        return None
-    book = data["items"][0]["volumeInfo"]
+from alexandria_library.modules.query_cache import normalize_query
+
+BIB_FIELDS = ("author", "title", "year", "publisher", "isbn")
+
+# Pode ser trocada, p. ex. por um servidor local nos testes
+BOOKS_API_URL = "https://www.googleapis.com/books/v1/volumes"
+
+# Validade das respostas guardadas em BibCache (s); buscas sem resultado expiram antes
+CACHE_TTL = 30 * 24 * 3600
+NEGATIVE_CACHE_TTL = 24 * 3600
+
+# Limite padrão de requisições à API (por segundo, com rajadas de até BOOKS_API_BURST)
+BOOKS_API_RATE = 1.0
+BOOKS_API_BURST = 5
+
+FIELD_START_RE = re.compile(r"(\w+)\s*=\s*")
+
+def _read_bib_value(text, i):
+    """Reads a value ({...}, "..." or bare word) starting at text[i]. Returns (value, end)."""
+    if i >= len(text):
+        return "", i
+    if text[i] == '{':
+        depth = 0
+        for j in range(i, len(text)):
+            if text[j] == '{':
+                depth += 1
+            elif text[j] == '}':
+                depth -= 1
+                if depth == 0:
+                    return text[i+1:j], j + 1
+        return text[i+1:], len(text)
+    if text[i] == '"':
+        j = text.find('"', i + 1)
+        j = len(text) if j < 0 else j
+        return text[i+1:j], j + 1
+    m = re.match(r"[^,}\s]*", text[i:])
+    return m.group(0), i + m.end()
+
+def parse_bibtex_fields(bibtex):
+    """
+    Extracts the fields of the first entry of a BibTeX text.
+
+    Parameters:
+    bibtex (str): BibTeX text, as produced by get_bibtex_from_books
+
+    Returns:
+    dict: Lowercase field names mapped to their values without braces
+          and surrounding spaces (e.g. {"year": "2016", ...})
+    """
+    fields = {}
+    start = bibtex.find('{')
+    if start < 0:
+        return fields
+    i = bibtex.find(',', start)
+    while 0 <= i < len(bibtex):
+        m = FIELD_START_RE.search(bibtex, i)
+        if m is None:
+            break
+        value, i = _read_bib_value(bibtex, m.end())
+        value = " ".join(value.replace('{', '').replace('}', '').split())
+        fields.setdefault(m.group(1).lower(), value)
+    return fields
+
+ENTRY_START_RE = re.compile(r"@\s*(\w+)\s*([{(])")
+
+def iter_bibtex_entries(text):
+    """
+    Yields the entries of a BibTeX text as tuples (entry_type, key, body),
+    where body is the text after the "key," up to (excluding) the closing
+    brace. @string and @preamble entries have key None and their whole
+    content in body; @comment entries are skipped. An unclosed last
+    entry is skipped too.
+    """
+    i = 0
+    while True:
+        m = ENTRY_START_RE.search(text, i)
+        if m is None:
+            return
+        entry_type = m.group(1).lower()
+        close = '}' if m.group(2) == '{' else ')'
+        start = m.end()
+        # Profundidade das chaves dentro da entrada; o delimitador só fecha
+        # a entrada fora delas (p. ex. "(" em title={A (b) c} não conta)
+        depth = 0
+        j = start
+        while j < len(text):
+            c = text[j]
+            if c == close and depth == 0:
+                break
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+            j += 1
+        if j >= len(text):
+            return
+        content = text[start:j]
+        i = j + 1
+        if entry_type == "comment":
+            continue
+        if entry_type in ("string", "preamble"):
+            yield entry_type, None, content
+            continue
+        key, comma, body = content.partition(',')
+        if not comma:
+            key, body = "", content
+        yield entry_type, key.strip(), body
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() waits until a token is available,
+    so on average at most rate calls per second are made, with bursts of
+    up to capacity calls.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, canceled=lambda: False):
+        """Waits for a token; returns False if canceled() became True meanwhile."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if canceled():
+                return False
+            # Em passos curtos, para o cancelamento ser rápido
+            time.sleep(min(wait, 0.2))
+
+class LookupCanceled(requests.RequestException):
+    """Raised by get_bibtex_from_books when canceled while waiting for the rate limit."""
+
+class BibCache:
+    """
+    Persistent cache of the BibTeX answers of the books API, in its own
+    SQLite file, keyed by the API URL and the normalized query. Answers
+    without a result are cached too, for a shorter time.
+
+    Each thread gets its own connection, so the same instance can be used
+    by several lookup threads.
+    """
+
+    def __init__(self, db_path, ttl=CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL):
+        """
+        Parameters:
+        - db_path (str): Path of the SQLite file
+        - ttl (float, optional): Validity (s) of the answers with a result
+        - negative_ttl (float, optional): Validity (s) of the answers without a result
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("""CREATE TABLE IF NOT EXISTS answers (
+                            url    TEXT NOT NULL,
+                            query  TEXT NOT NULL,
+                            time   REAL,
+                            bibtex TEXT,
+                            PRIMARY KEY (url, query))""")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Closes the connection of the calling thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def get(self, url, query):
+        """
+        Returns (found, bibtex): found is False if the answer is missing
+        or expired; bibtex is None if the API had no result.
+        """
+        row = self._connection().execute("SELECT time, bibtex FROM answers WHERE url = ? AND query = ?",
+                                         (url, normalize_query(query))).fetchone()
+        if row is None:
+            return False, None
+        stored, bibtex = row
+        ttl = self.ttl if bibtex is not None else self.negative_ttl
+        if time.time() - stored > ttl:
+            return False, None
+        return True, bibtex
+
+    def put(self, url, query, bibtex):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)",
+                     (url, normalize_query(query), time.time(), bibtex))
+        conn.commit()
+
+# Sessão compartilhada: as conexões (keep-alive, TLS) são reaproveitadas entre as buscas
+_session = None
+_session_lock = threading.Lock()
+
+# Limite compartilhado por todas as buscas que não trazem o seu
+_limiter = TokenBucket(BOOKS_API_RATE, BOOKS_API_BURST)
+
+def set_rate_limit(rate, capacity=BOOKS_API_BURST):
+    """Changes the shared rate limit of the requests to the books API."""
+    global _limiter
+    _limiter = TokenBucket(rate, capacity)
+
+def get_session():
+    """Returns the shared requests.Session, with a pool of keep-alive connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def bibtex_from_volume(book):
+    """Builds the BibTeX entry of a volumeInfo of the books API."""
     title = book.get("title")
     authors = " and ".join(book.get("authors", []))
     publisher = book.get("publisher")
@@ -22,6 +253,54 @@ def get_bibtex_from_books(title_query):
     bibtex = f"@book{{{key},\n  title={{ {title} }},\n  author={{ {authors} }},\n  publisher={{ {publisher} }},\n  year={{ {year} }},\n  isbn={{ {isbn} }}\n}}"
     return bibtex
 
+def get_bibtex_from_books(title_query, cache=None, url=None, limiter=None, timeout=10,
+                          canceled=lambda: False):
+    """
+    Looks a book up by title in the books API and returns its BibTeX
+    entry, or None if nothing was found. The request goes through the
+    shared session; blocks, so it must not be called from the GUI thread
+    (see bib_lookup.BibLookupWorker).
+
+    Parameters:
+    - title_query (str): Title (or words of the title) of the book
+    - cache (BibCache, optional): Answers cache, consulted first
+    - url (str, optional): URL of the API. Defaults to BOOKS_API_URL.
+    - limiter (TokenBucket, optional): Rate limit of the request. Defaults
+      to the shared limit (see set_rate_limit).
+    - timeout (float, optional): Timeout (s) of the request
+    - canceled (callable, optional): Returns True to give up while waiting
+      for the rate limit (raises LookupCanceled)
+
+    Returns:
+    - str: BibTeX text, or None
+
+    Raises:
+    - requests.RequestException: On network or HTTP errors (not cached)
+    """
+    url = url or BOOKS_API_URL
+    if cache is not None:
+        found, bibtex = cache.get(url, title_query)
+        if found:
+            return bibtex
+
+    if not (limiter or _limiter).acquire(canceled):
+        raise LookupCanceled("canceled")
+    params = {"q": f"intitle:{title_query}", "maxResults": 1}
+    r = get_session().get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    try:
+        data = r.json()
+    except ValueError as e:
+        raise requests.RequestException(f"invalid answer: {e}") from None
+    if "items" not in data or not data["items"]:
+        bibtex = None
+    else:
+        bibtex = bibtex_from_volume(data["items"][0]["volumeInfo"])
+
+    if cache is not None:
+        cache.put(url, title_query, bibtex)
+    return bibtex
+
 if __name__ == "__main__":
     bib = get_bibtex_from_books("Introduction to Logic - Routledge 2016")
     print(bib)
@@ -0,0 +1,701 @@
+import os
+import json
+import time
+import sqlite3
+
+from alexandria_library.modules.filetypes import sniff_file_type
+from alexandria_library.modules.pdfs import metadata_text
+from alexandria_library.modules.sidecar_store import get_sidecar_store, is_store_file
+
+SIDECAR_EXTENSIONS = ('.bib', '.json')
+
+# Intervalo máximo (s) entre os commits de um rescan: a trava de escrita do
+# SQLite não fica presa durante toda a varredura de uma biblioteca grande.
+# Depois de cada commit o rescan espera um pouco, para que as outras conexões
+# (que tentam de novo a cada 100 ms no máximo) consigam escrever
+RESCAN_COMMIT_INTERVAL = 0.5
+RESCAN_COMMIT_PAUSE = 0.1
+
+# Incrementar quando o esquema mudar: o catálogo é só um cache e é recriado
+SCHEMA_VERSION = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER
+);
+INSERT OR IGNORE INTO meta VALUES ('seq', 0);
+INSERT OR IGNORE INTO meta VALUES ('content_seq', 0);
+INSERT OR IGNORE INTO meta VALUES ('trimmed', 0);
+INSERT OR IGNORE INTO meta VALUES ('sidecar_store', 0);
+
+CREATE TABLE IF NOT EXISTS directories (
+    path   TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime  REAL
+);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories(parent);
+
+CREATE TABLE IF NOT EXISTS files (
+    path      TEXT PRIMARY KEY,
+    dir       TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    size      INTEGER,
+    mtime     REAL,
+    has_bib   INTEGER DEFAULT 0,
+    has_json  INTEGER DEFAULT 0,
+    bib_mtime  REAL,
+    json_mtime REAL,
+    ocr        INTEGER,
+    kind       TEXT,
+    seq        INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+CREATE INDEX IF NOT EXISTS files_seq ON files(seq);
+
+CREATE TABLE IF NOT EXISTS bib_texts (
+    path  TEXT PRIMARY KEY,
+    mtime REAL,
+    text  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS pdf_metadata (
+    path  TEXT PRIMARY KEY,
+    size  INTEGER,
+    mtime REAL,
+    info  TEXT,
+    pages INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS removed (
+    path TEXT,
+    seq  INTEGER
+);
+CREATE INDEX IF NOT EXISTS removed_seq ON removed(seq);
+"""
+
+# Número máximo de remoções guardadas para a sincronização dos índices
+MAX_REMOVED_LOG = 100000
+
+def is_sidecar(filename):
+    """Returns True for the .bib/.json files that accompany library files."""
+    return filename.endswith(SIDECAR_EXTENSIONS)
+
+def subtree_clause(column):
+    # Seleciona o diretório raiz e todos os seus descendentes.
+    # A comparação por intervalo permite que o SQLite use o índice.
+    return f"({column} = ? OR ({column} >= ? AND {column} < ?))"
+
+def subtree_args(root):
+    prefix = os.path.join(root, '')
+    return (root, prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+def read_ocr(json_path):
+    """Returns the "ocr" value of a .json sidecar as 1/0, or None if unknown."""
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            ocr = json.load(f).get("ocr", None)
+    except (OSError, ValueError, AttributeError):
+        return None
+    if ocr == True:
+        return 1
+    if ocr == False:
+        return 0
+    return None
+
+def _read_text(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return ""
+
+class LibraryCatalog:
+    """
+    Persistent SQLite catalog of the files in the library.
+
+    The catalog stores, for each library file, its path, size, mtime and
+    whether the .bib/.json sidecars exist, together with the "ocr" value of
+    the .json sidecar (read again only when its mtime changes), so the
+    listing needs no per-file I/O. Directories are stored with
+    their mtime, so a rescan only lists again the directories whose
+    mtime changed (a file was created, removed or renamed inside them).
+    The text of the .bib sidecars is cached and only read again when
+    the sidecar mtime changes.
+
+    When the consolidated SidecarStore of the library is enabled, the
+    .bib text and the "ocr" value come from it, with one query per
+    directory, instead of from the sidecar files.
+
+    The type of each file (see filetypes.sniff_file_type) is recognized
+    from its first bytes when the file is cataloged, and only again when
+    its size or mtime changes, so the type needs no I/O afterwards.
+
+    Every modified file row receives a new sequence number and every
+    removal is logged, so in-memory indexes can be synchronized with
+    changes_since() instead of reloading the whole catalog.
+
+    A connection can only be used by the thread that created it, so each
+    thread must create its own LibraryCatalog.
+    """
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+        - db_path (str): Path of the SQLite file. Intermediate directories
+          are created if necessary.
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            for table in ("meta", "directories", "files", "bib_texts", "pdf_metadata", "removed"):
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def commit(self):
+        """Commits the changes made with commit=False."""
+        self.conn.commit()
+
+    def rollback(self):
+        """Discards the changes made with commit=False."""
+        self.conn.rollback()
+
+    def sequence(self):
+        """Returns the sequence number of the last change in the catalog."""
+        return self.conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()[0]
+
+    def content_sequence(self):
+        """Returns the number of changes of the content index (see mark_content_changed)."""
+        return self.conn.execute("SELECT value FROM meta WHERE key = 'content_seq'").fetchone()[0]
+
+    def _next_sequence(self):
+        self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'seq'")
+        return self.sequence()
+
+    def has_directory(self, dir_path):
+        """Returns True if dir_path was already scanned at least once."""
+        row = self.conn.execute("SELECT mtime FROM directories WHERE path = ?",
+                                (os.path.normpath(dir_path),)).fetchone()
+        return row is not None and row[0] is not None
+
+    def rescan(self, root_dir, canceled=lambda: False, check_sidecars=False, force=False, check_files=False):
+        """
+        Synchronizes the catalog with the subtree of root_dir.
+
+        Every directory of the subtree is stat'ed, but only the directories
+        whose mtime differs from the stored one are listed again. Subtrees
+        of unchanged directories are reached through the catalog itself.
+        The changes are committed every RESCAN_COMMIT_INTERVAL seconds, so
+        the other connections can write in between.
+
+        Parameters:
+        - root_dir (str): Root of the subtree to synchronize
+        - canceled (callable, optional): Returns True to stop the rescan
+        - check_sidecars (bool, optional): If True, the .bib/.json sidecars
+          of the unchanged directories are also stat'ed, to detect sidecars
+          edited in place (which don't change the directory mtime)
+        - force (bool, optional): If True, root_dir itself is listed again even
+          if its mtime didn't change (e.g. a file inside it was modified)
+        - check_files (bool, optional): If True, the files of the unchanged
+          directories are also stat'ed, and the directories with a file
+          rewritten in place (which doesn't change the directory mtime, e.g.
+          while the program was closed) are listed again
+
+        Returns:
+        - int: Number of directories that were listed again
+        """
+        root_dir = os.path.normpath(root_dir)
+        self._check_sidecar_source(root_dir)
+        changed = 0
+        stack = [(root_dir, os.path.dirname(root_dir))]
+        last_commit = time.monotonic()
+
+        try:
+            while stack:
+                if canceled():
+                    break
+                dir_path, parent = stack.pop()
+
+                try:
+                    mtime = os.stat(dir_path).st_mtime
+                except OSError:
+                    self._forget_subtree(dir_path)
+                    continue
+
+                row = self.conn.execute("SELECT mtime FROM directories WHERE path = ?",
+                                        (dir_path,)).fetchone()
+                if (row is not None and row[0] == mtime and not (force and dir_path == root_dir)
+                        and not (check_files and self._files_modified(dir_path))):
+                    subdirs = [r[0] for r in self.conn.execute(
+                                "SELECT path FROM directories WHERE parent = ?", (dir_path,))]
+                    if check_sidecars:
+                        self._check_sidecars(dir_path)
+                else:
+                    subdirs = self._relist_directory(dir_path, parent, mtime)
+                    changed += 1
+
+                for subdir in subdirs:
+                    stack.append((subdir, dir_path))
+
+                if self.conn.in_transaction and time.monotonic() - last_commit >= RESCAN_COMMIT_INTERVAL:
+                    self.conn.commit()
+                    time.sleep(RESCAN_COMMIT_PAUSE)
+                    last_commit = time.monotonic()
+        finally:
+            self.conn.commit()
+
+        return changed
+
+    def _check_sidecar_source(self, root_dir):
+        # Ao habilitar ou desabilitar o SidecarStore, os estados dos sidecars
+        # mudam de fonte: todos os diretórios são listados de novo, uma vez
+        source = int(get_sidecar_store(root_dir) is not None)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'sidecar_store'").fetchone()
+        if row[0] != source:
+            self.conn.execute("UPDATE directories SET mtime = NULL")
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'sidecar_store'", (source,))
+            self.conn.commit()
+
+    def _relist_directory(self, dir_path, parent, mtime):
+        """Lists one directory and replaces its entries in the catalog."""
+        files = {}
+        bibs = {}
+        jsons = {}
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file():
+                            if entry.name.endswith('.bib'):
+                                bibs[entry.name[:-4]] = entry.stat().st_mtime
+                            elif entry.name.endswith('.json'):
+                                jsons[entry.name[:-5]] = entry.stat().st_mtime
+                            elif not is_sidecar(entry.name) and not is_store_file(entry.name):
+                                st = entry.stat()
+                                files[entry.name] = (st.st_size, st.st_mtime)
+                    except OSError:
+                        continue
+        except OSError:
+            self._forget_subtree(dir_path)
+            return []
+
+        store = get_sidecar_store(dir_path)
+        if store is not None:
+            # Os sidecars vêm do arquivo único, numa só leitura do diretório
+            entries = store.directory_entries(dir_path)
+            bibs = {name: e[1] for name, e in entries.items() if e[0] is not None}
+            jsons = {name: e[3] for name, e in entries.items() if e[2] is not None}
+
+        # O valor de OCR só é lido de novo se o .json mudou, e o tipo se o arquivo mudou
+        old = {r[0]: r[1:] for r in self.conn.execute(
+                    "SELECT name, json_mtime, ocr, size, mtime, kind FROM files WHERE dir = ?", (dir_path,))}
+
+        seq = self._next_sequence()
+        rows = []
+        for name, (size, file_mtime) in files.items():
+            path = os.path.join(dir_path, name)
+            json_mtime = jsons.get(name)
+            old_json_mtime, ocr, old_size, old_mtime, kind = old.get(name, (None,) * 5)
+            if json_mtime is None:
+                ocr = None
+            elif store is not None:
+                ocr = entries[name][2]
+            elif old_json_mtime != json_mtime:
+                ocr = read_ocr(path + '.json')
+            if kind is None or old_size != size or old_mtime != file_mtime:
+                kind = sniff_file_type(path)
+            rows.append((path, dir_path, name, size, file_mtime,
+                         int(name in bibs), int(json_mtime is not None),
+                         bibs.get(name), json_mtime, ocr, kind, seq))
+
+        self._log_removed([os.path.join(dir_path, name)
+                           for name in set(old).difference(files)], seq)
+
+        self.conn.execute("DELETE FROM files WHERE dir = ?", (dir_path,))
+        self.conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+        for row in rows:
+            if row[7] is not None:
+                self._update_bib_text(row[0], row[7],
+                                      entries[row[2]][0] if store is not None else None)
+
+        # Subdiretórios removidos saem do catálogo com toda a sua subárvore
+        known = [r[0] for r in self.conn.execute(
+                    "SELECT path FROM directories WHERE parent = ?", (dir_path,))]
+        for gone in set(known).difference(subdirs):
+            self._forget_subtree(gone)
+
+        self.conn.execute("INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+                          (dir_path, parent, mtime))
+        for subdir in subdirs:
+            # mtime NULL força a listagem do novo subdiretório
+            self.conn.execute("INSERT OR IGNORE INTO directories VALUES (?, ?, NULL)",
+                              (subdir, dir_path))
+        return subdirs
+
+    def _files_modified(self, dir_path):
+        """Returns True if a cataloged file of dir_path has a different size or mtime."""
+        for path, size, mtime in self.conn.execute(
+                    "SELECT path, size, mtime FROM files WHERE dir = ?", (dir_path,)).fetchall():
+            try:
+                st = os.stat(path)
+            except OSError:
+                return True
+            if st.st_size != size or st.st_mtime != mtime:
+                return True
+        return False
+
+    def _check_sidecars(self, dir_path):
+        store = get_sidecar_store(dir_path)
+        if store is not None:
+            self._check_store(dir_path, store)
+            return
+        rows = self.conn.execute("""SELECT path, has_bib, bib_mtime, has_json, json_mtime FROM files
+                                    WHERE dir = ? AND (has_bib = 1 OR has_json = 1)""",
+                                 (dir_path,)).fetchall()
+        for path, has_bib, bib_mtime, has_json, json_mtime in rows:
+            if has_bib:
+                try:
+                    mtime = os.stat(path + '.bib').st_mtime
+                except OSError:
+                    mtime = None
+                if mtime != bib_mtime:
+                    self.update_bib(path, mtime=mtime, commit=False)
+            if has_json:
+                try:
+                    mtime = os.stat(path + '.json').st_mtime
+                except OSError:
+                    mtime = None
+                if mtime != json_mtime:
+                    self.update_ocr(path, mtime=mtime, commit=False)
+
+    def _check_store(self, dir_path, store):
+        entries = store.directory_entries(dir_path)
+        rows = self.conn.execute("SELECT path, name, bib_mtime, json_mtime FROM files WHERE dir = ?",
+                                 (dir_path,)).fetchall()
+        for path, name, bib_mtime, json_mtime in rows:
+            bib, new_bib_mtime, ocr, new_ocr_mtime = entries.get(name, (None,) * 4)
+            if new_bib_mtime != bib_mtime:
+                self.update_bib(path, commit=False)
+            if new_ocr_mtime != json_mtime:
+                self.update_ocr(path, commit=False)
+
+    def _update_bib_text(self, path, mtime, text=None):
+        row = self.conn.execute("SELECT mtime FROM bib_texts WHERE path = ?", (path,)).fetchone()
+        if row is None or row[0] != mtime:
+            if text is None:
+                text = _read_text(path + '.bib')
+            self.conn.execute("INSERT OR REPLACE INTO bib_texts VALUES (?, ?, ?)",
+                              (path, mtime, text))
+
+    def update_bib(self, path, mtime=None, commit=True):
+        """
+        Updates the .bib state of one cataloged file, e.g. after saving its
+        sidecar. Does nothing if the file is not in the catalog.
+
+        Parameters:
+        - path (str): Path of the library file (not of the .bib)
+        - mtime (float, optional): mtime of the .bib; stat'ed if None
+        - commit (bool, optional): Commit the transaction. Defaults to True.
+        """
+        text = None
+        store = get_sidecar_store(path)
+        if store is not None:
+            text, mtime, _, _ = store.entry(path)
+        elif mtime is None:
+            try:
+                mtime = os.stat(path + '.bib').st_mtime
+            except OSError:
+                mtime = None
+        seq = self._next_sequence()
+        cur = self.conn.execute("UPDATE files SET has_bib = ?, bib_mtime = ?, seq = ? WHERE path = ?",
+                                (int(mtime is not None), mtime, seq, path))
+        if cur.rowcount and mtime is not None:
+            self._update_bib_text(path, mtime, text)
+        elif mtime is None:
+            self.conn.execute("DELETE FROM bib_texts WHERE path = ?", (path,))
+        if commit:
+            self.conn.commit()
+
+    def update_ocr(self, path, mtime=None, commit=True):
+        """
+        Updates the .json state (and the "ocr" value) of one cataloged file,
+        e.g. after verifying its OCR. Does nothing if the file is not in
+        the catalog.
+
+        Parameters:
+        - path (str): Path of the library file (not of the .json)
+        - mtime (float, optional): mtime of the .json; stat'ed if None
+        - commit (bool, optional): Commit the transaction. Defaults to True.
+        """
+        store = get_sidecar_store(path)
+        if store is not None:
+            _, _, ocr, mtime = store.entry(path)
+        else:
+            if mtime is None:
+                try:
+                    mtime = os.stat(path + '.json').st_mtime
+                except OSError:
+                    mtime = None
+            ocr = read_ocr(path + '.json') if mtime is not None else None
+        seq = self._next_sequence()
+        self.conn.execute("UPDATE files SET has_json = ?, json_mtime = ?, ocr = ?, seq = ? WHERE path = ?",
+                          (int(mtime is not None), mtime, ocr, seq, path))
+        if commit:
+            self.conn.commit()
+
+    def _log_removed(self, paths, seq):
+        if not paths:
+            return
+        self.conn.executemany("INSERT INTO removed VALUES (?, ?)", [(p, seq) for p in paths])
+        self.conn.executemany("DELETE FROM bib_texts WHERE path = ?", [(p,) for p in paths])
+        self.conn.executemany("DELETE FROM pdf_metadata WHERE path = ?", [(p,) for p in paths])
+
+    def _forget_subtree(self, root_dir):
+        args = subtree_args(root_dir)
+        seq = self._next_sequence()
+        self._log_removed([r[0] for r in self.conn.execute(
+                            f"SELECT path FROM files WHERE {subtree_clause('dir')}", args)], seq)
+        self.conn.execute(f"DELETE FROM files WHERE {subtree_clause('dir')}", args)
+        self.conn.execute(f"DELETE FROM directories WHERE {subtree_clause('path')}", args)
+
+    def changes_since(self, seq):
+        """
+        Returns the changes made after the sequence number seq.
+
+        Returns:
+        - tuple: (rows, removed, last_seq), where rows are tuples
+          (path, name, bib_text, has_bib, ocr, info, kind) of the created or
+          modified files (ocr is 1, 0 or None if unknown; info is the JSON of
+          the up-to-date PDF metadata, or None; kind is the file type), removed
+          are the paths of the removed files and last_seq is the sequence
+          number to use in the next call. When seq is older than the
+          removal log, removed is None and rows hold the whole catalog.
+        """
+        last_seq = self.sequence()
+        trimmed = self.conn.execute("SELECT value FROM meta WHERE key = 'trimmed'").fetchone()[0]
+        if seq < trimmed:
+            seq = 0
+
+        rows = self.conn.execute("""SELECT f.path, f.name, b.text, f.has_bib, f.ocr, m.info, f.kind FROM files f
+                                    LEFT JOIN bib_texts b ON b.path = f.path
+                                    LEFT JOIN pdf_metadata m ON m.path = f.path 
+                                         AND m.size = f.size AND m.mtime = f.mtime
+                                    WHERE f.seq > ?""", (seq,)).fetchall()
+        if seq == 0:
+            removed = None
+        else:
+            removed = [r[0] for r in self.conn.execute(
+                        "SELECT path FROM removed WHERE seq > ?", (seq,))]
+
+        # Mantém o log de remoções limitado
+        row = self.conn.execute("SELECT seq FROM removed ORDER BY seq DESC LIMIT 1 OFFSET ?",
+                                (MAX_REMOVED_LOG,)).fetchone()
+        if row is not None:
+            self.conn.execute("DELETE FROM removed WHERE seq <= ?", (row[0],))
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'trimmed'", (row[0],))
+            self.conn.commit()
+        return rows, removed, last_seq
+
+    def file_state(self, path):
+        """Returns (has_bib, ocr) of one cataloged file, or None if unknown."""
+        return self.conn.execute("SELECT has_bib, ocr FROM files WHERE path = ?", (path,)).fetchone()
+
+    def file_kind(self, path):
+        """
+        Returns the cached type of one cataloged file ("" if unknown), or
+        None if the file is not cataloged.
+        """
+        row = self.conn.execute("SELECT kind FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row is not None else None
+
+    def list_unverified_pdfs(self, root_dir):
+        """
+        Returns the paths of the cataloged .pdf files under root_dir without
+        a known "ocr" value in a .json sidecar newer than the file.
+        """
+        root_dir = os.path.normpath(root_dir)
+        return [r[0] for r in self.conn.execute(
+                    f"""SELECT path FROM files WHERE {subtree_clause('dir')}
+                        AND lower(name) LIKE '%.pdf'
+                        AND NOT (ocr IS NOT NULL AND json_mtime >= mtime)
+                        ORDER BY path""",
+                    subtree_args(root_dir))]
+
+    def list_files_without_bib(self, root_dir):
+        """
+        Returns tuples (path, info) of the cataloged files under root_dir
+        without a .bib sidecar, where info is the JSON of the up-to-date
+        PDF metadata, or None.
+        """
+        root_dir = os.path.normpath(root_dir)
+        return self.conn.execute(
+                    f"""SELECT f.path, m.info FROM files f
+                        LEFT JOIN pdf_metadata m ON m.path = f.path
+                             AND m.size = f.size AND m.mtime = f.mtime
+                        WHERE {subtree_clause('f.dir')} AND f.has_bib = 0
+                        ORDER BY f.path""",
+                    subtree_args(root_dir)).fetchall()
+
+    def list_files_info(self, paths):
+        """
+        Returns tuples (path, has_bib, kind, info) of the cataloged files
+        among paths (e.g. the rows selected in the table), in the given
+        order, where info is as in list_files_without_bib.
+        """
+        query = """SELECT f.path, f.has_bib, f.kind, m.info FROM files f
+                   LEFT JOIN pdf_metadata m ON m.path = f.path
+                        AND m.size = f.size AND m.mtime = f.mtime
+                   WHERE f.path = ?"""
+        rows = []
+        for path in paths:
+            row = self.conn.execute(query, (os.path.normpath(path),)).fetchone()
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def count_bib_texts(self, root_dir):
+        """Returns the number of cataloged files under root_dir with a .bib sidecar."""
+        root_dir = os.path.normpath(root_dir)
+        return self.conn.execute(
+                    f"SELECT COUNT(*) FROM files WHERE {subtree_clause('dir')} AND has_bib = 1",
+                    subtree_args(root_dir)).fetchone()[0]
+
+    def iter_bib_texts(self, root_dir):
+        """
+        Yields tuples (path, bib_text) of the cataloged files under root_dir
+        with a .bib sidecar, ordered by path, reading them from the database
+        as they are consumed.
+        """
+        root_dir = os.path.normpath(root_dir)
+        yield from self.conn.execute(
+                    f"""SELECT f.path, b.text FROM files f
+                        JOIN bib_texts b ON b.path = f.path
+                        WHERE {subtree_clause('f.dir')} AND f.has_bib = 1
+                        ORDER BY f.path""",
+                    subtree_args(root_dir))
+
+    def list_file_sizes(self, root_dir):
+        """Returns tuples (path, size) of all cataloged files under root_dir."""
+        root_dir = os.path.normpath(root_dir)
+        return self.conn.execute(
+                    f"SELECT path, size FROM files WHERE {subtree_clause('dir')}",
+                    subtree_args(root_dir)).fetchall()
+
+    def list_pdfs(self, root_dir):
+        """Returns tuples (path, size, mtime) of the cataloged .pdf files under root_dir."""
+        root_dir = os.path.normpath(root_dir)
+        return self.conn.execute(
+                    f"""SELECT path, size, mtime FROM files WHERE {subtree_clause('dir')}
+                        AND lower(name) LIKE '%.pdf' ORDER BY path""",
+                    subtree_args(root_dir)).fetchall()
+
+    def mark_content_changed(self, commit=True):
+        """
+        Increments the content sequence, when the content index (kept
+        outside the catalog) changed. Unlike the sequence of the catalog,
+        it only invalidates the cached searches on the content.
+        """
+        self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'content_seq'")
+        if commit:
+            self.conn.commit()
+
+    def list_pdfs_without_metadata(self, root_dir):
+        """
+        Returns tuples (path, size, mtime) of the cataloged .pdf files under
+        root_dir whose metadata is missing or older than the file.
+        """
+        root_dir = os.path.normpath(root_dir)
+        return self.conn.execute(
+                    f"""SELECT f.path, f.size, f.mtime FROM files f
+                        LEFT JOIN pdf_metadata m ON m.path = f.path
+                        WHERE {subtree_clause('f.dir')} AND lower(f.name) LIKE '%.pdf'
+                        AND (m.path IS NULL OR m.size != f.size OR m.mtime != f.mtime)
+                        ORDER BY f.path""",
+                    subtree_args(root_dir)).fetchall()
+
+    def store_pdf_metadata(self, path, size, mtime, info, pages, commit=True):
+        """
+        Stores the metadata of a PDF, valid while its size and mtime don't
+        change. The file is marked as modified for the in-memory indexes
+        (and the cached searches) only if its searchable metadata changed.
+
+        Parameters:
+        - path (str): Path of the PDF
+        - size, mtime: Size and mtime of the PDF when the metadata was read
+        - info (dict): /Info entries as returned by pdfs.get_metadata_pdf
+        - pages (int): Number of pages (None if unknown)
+        - commit (bool, optional): Commit the transaction. Defaults to True.
+        """
+        row = self.conn.execute("SELECT info FROM pdf_metadata WHERE path = ?", (path,)).fetchone()
+        old_info = json.loads(row[0]) if row is not None else {}
+        self.conn.execute("INSERT OR REPLACE INTO pdf_metadata VALUES (?, ?, ?, ?, ?)",
+                          (path, size, mtime, json.dumps(info, ensure_ascii=False), pages))
+        # A maioria dos PDFs não tem título/autor: sem mudança no texto buscável,
+        # as buscas em cache continuam válidas
+        if metadata_text(info) != metadata_text(old_info):
+            seq = self._next_sequence()
+            self.conn.execute("UPDATE files SET seq = ? WHERE path = ?", (seq, path))
+        if commit:
+            self.conn.commit()
+
+    def pdf_metadata(self, path):
+        """
+        Returns (info, pages) of the stored metadata of a PDF, or None if
+        missing or stale (the file changed since it was read).
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        row = self.conn.execute("SELECT info, pages FROM pdf_metadata WHERE path = ? AND size = ? AND mtime = ?",
+                                (path, st.st_size, st.st_mtime)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def list_files(self, root_dir):
+        """
+        Returns the paths of all cataloged files under root_dir,
+        excluding the .bib/.json sidecars.
+        """
+        root_dir = os.path.normpath(root_dir)
+        return [r[0] for r in self.conn.execute(
+                    f"SELECT path FROM files WHERE {subtree_clause('dir')} ORDER BY path",
+                    subtree_args(root_dir))]
+
+    def list_directories(self, root_dir):
+        """Returns the paths of all cataloged directories under root_dir (included)."""
+        root_dir = os.path.normpath(root_dir)
+        return [r[0] for r in self.conn.execute(
+                    f"SELECT path FROM directories WHERE {subtree_clause('path')}",
+                    subtree_args(root_dir))]
+
+    def list_records(self, root_dir):
+        """
+        Returns tuples (path, has_bib, ocr) of all cataloged files under
+        root_dir, where ocr is 1, 0 or None if unknown.
+        """
+        root_dir = os.path.normpath(root_dir)
+        return self.conn.execute(
+                    f"SELECT path, has_bib, ocr FROM files WHERE {subtree_clause('dir')} ORDER BY path",
+                    subtree_args(root_dir)).fetchall()
+
+    def count_files(self, root_dir):
+        root_dir = os.path.normpath(root_dir)
+        return self.conn.execute(
+                    f"SELECT COUNT(*) FROM files WHERE {subtree_clause('dir')}",
+                    subtree_args(root_dir)).fetchone()[0]
@@ -0,0 +1,293 @@
+import os
+import re
+import time
+import zlib
+import sqlite3
+import threading
+from functools import partial
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from alexandria_library.modules.catalog import LibraryCatalog, subtree_clause, subtree_args
+from alexandria_library.modules.pdfs import has_text_layer, extract_pdf_text
+from alexandria_library.modules.process_pool import new_pool, call_with_timeout, bounded_map
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Incrementar quando o esquema mudar: o índice é recriado
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id    INTEGER PRIMARY KEY,
+    path  TEXT UNIQUE NOT NULL,
+    size  INTEGER,
+    mtime REAL,
+    text  BLOB
+);
+
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    doc   INTEGER NOT NULL,
+    PRIMARY KEY (token, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings(doc);
+"""
+
+def _read_content(file_path, max_pages, pages_text):
+    # Scanned PDFs (sem camada de texto) não são lidos
+    if has_text_layer(file_path):
+        extract_pdf_text(file_path, max_pages, pages_text)
+
+def extract_content(file_path, max_pages=200, timeout=0):
+    """
+    Extracts the text of one PDF in a pool process. Scanned PDFs (without
+    a text layer) are not read. The timeout covers the whole document,
+    the text layer check included; if it expires, the text of the pages
+    already read is kept.
+
+    Returns:
+    - tuple: (text, error)
+    """
+    pages_text = []
+    try:
+        call_with_timeout(timeout, _read_content, file_path, max_pages, pages_text)
+        error = None
+    except TimeoutError as e:
+        error = str(e)
+    except MemoryError:
+        error = "memory limit"
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    return "\n".join(pages_text), error
+
+class ContentIndex:
+    """
+    Persistent full-text index of the content of the PDFs, in its own
+    SQLite file.
+
+    The text of each document is stored compressed (zlib), together with
+    the size and mtime of the file when it was read, so only new or
+    modified files are read again. Each distinct lowercase word token of
+    a document is stored in a (token, doc) table clustered by token, so a
+    word (or word prefix) is answered with one range scan of the index,
+    without decompressing any text; only multi-word phrases are verified
+    against the text of the candidate documents.
+
+    Each thread gets its own connection, so the same instance can be used
+    by the search workers and by the indexer.
+    """
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+        - db_path (str): Path of the SQLite file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS documents")
+            conn.execute("DROP TABLE IF EXISTS postings")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Closes the connection of the calling thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def commit(self):
+        self._connection().commit()
+
+    def document_states(self, root_dir):
+        """Returns {path: (size, mtime)} of the indexed documents under root_dir."""
+        root_dir = os.path.normpath(root_dir)
+        return {r[0]: (r[1], r[2]) for r in self._connection().execute(
+                    f"SELECT path, size, mtime FROM documents WHERE {subtree_clause('path')}",
+                    subtree_args(root_dir))}
+
+    def update(self, path, size, mtime, text, commit=True):
+        """Indexes (or indexes again) the text of one document."""
+        conn = self._connection()
+        row = conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+        blob = zlib.compress(text.encode('utf-8'))
+        if row is None:
+            doc = conn.execute("INSERT INTO documents (path, size, mtime, text) VALUES (?, ?, ?, ?)",
+                               (path, size, mtime, blob)).lastrowid
+        else:
+            doc = row[0]
+            conn.execute("UPDATE documents SET size = ?, mtime = ?, text = ? WHERE id = ?",
+                         (size, mtime, blob, doc))
+            conn.execute("DELETE FROM postings WHERE doc = ?", (doc,))
+        tokens = set(TOKEN_RE.findall(text.lower()))
+        conn.executemany("INSERT INTO postings VALUES (?, ?)", [(token, doc) for token in tokens])
+        if commit:
+            conn.commit()
+
+    def remove(self, paths, commit=True):
+        conn = self._connection()
+        for path in paths:
+            row = conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM postings WHERE doc = ?", (row[0],))
+                conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+        if commit:
+            conn.commit()
+
+    def _token_docs(self, token):
+        # Prefixo: "algor" encontra "algorithm", como na busca enquanto digita
+        end = token[:-1] + chr(ord(token[-1]) + 1)
+        return {r[0] for r in self._connection().execute(
+                    "SELECT DISTINCT doc FROM postings WHERE token >= ? AND token < ?", (token, end))}
+
+    def text(self, path):
+        """Returns the indexed text of a document ("" if not indexed)."""
+        row = self._connection().execute("SELECT text FROM documents WHERE path = ?", (path,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else ""
+
+    def lookup(self, value):
+        """
+        Returns the set of paths of the documents whose content contains
+        value (case-insensitive): every word of value must start a word of
+        the document and, for phrases, the whole value must be in the text.
+        """
+        value = " ".join(value.lower().split())
+        tokens = TOKEN_RE.findall(value)
+        if not tokens:
+            return set()
+        docs = None
+        # O token mais longo costuma ser o mais seletivo
+        for token in sorted(set(tokens), key=len, reverse=True):
+            found = self._token_docs(token)
+            docs = found if docs is None else docs & found
+            if not docs:
+                return set()
+
+        phrase = not (len(tokens) == 1 and tokens[0] == value)
+        columns = "path, text" if phrase else "path"
+        conn = self._connection()
+        docs = list(docs)
+        paths = set()
+        # Em blocos, abaixo do limite de parâmetros do SQLite
+        for i in range(0, len(docs), 900):
+            chunk = docs[i:i + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT {columns} FROM documents WHERE id IN ({placeholders})", chunk):
+                if not phrase or value in " ".join(zlib.decompress(row[1]).decode('utf-8').lower().split()):
+                    paths.add(row[0])
+        return paths
+
+class ContentIndexer(QThread):
+    """
+    Brings the ContentIndex of a directory subtree up to date with the
+    catalog in background, extracting the text of the new or modified
+    PDFs with a pool of processes (at most max_pages pages and timeout
+    seconds per document, in processes limited to memory_limit_mb), and
+    removing the documents no longer in the catalog.
+
+    The changed files receive a new sequence number in the catalog, so
+    the cached search results are invalidated.
+
+    Signals:
+    - progress_updated: Emits the percentage of read files
+    - indexing_finished: Emits the number of read files
+    """
+
+    BATCH_SIZE = 50
+    BATCH_INTERVAL = 2.0
+
+    progress_updated = pyqtSignal(int)
+    indexing_finished = pyqtSignal(int)
+
+    def __init__(self, root_dir, catalog_path, content_index, workers=2, max_pages=200, timeout=60,
+                 memory_limit_mb=1024, rescan=True):
+        """
+        Parameters:
+        - root_dir (str): Directory whose subtree is indexed
+        - catalog_path (str): Path of the SQLite catalog
+        - content_index (ContentIndex): Index to update
+        - workers (int, optional): Number of processes
+        - max_pages (int, optional): Maximum number of pages read per document
+        - timeout (float, optional): Maximum time (s) per document; 0 disables it
+        - memory_limit_mb (int, optional): Address space limit of each
+          process in MiB; 0 disables it
+        - rescan (bool, optional): Rescan the catalog first; False if it is
+          kept up to date by a LibraryWatcher
+        """
+        super().__init__()
+        self.root_dir = os.path.normpath(root_dir)
+        self.catalog_path = catalog_path
+        self.content_index = content_index
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.rescan = rescan
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def run(self):
+        index = self.content_index
+        indexed = 0
+        catalog = None
+        try:
+            catalog = LibraryCatalog(self.catalog_path)
+            if self.rescan:
+                catalog.rescan(self.root_dir, canceled=lambda: self.canceled)
+            pdfs = {path: (size, mtime) for path, size, mtime in catalog.list_pdfs(self.root_dir)}
+            states = index.document_states(self.root_dir)
+
+            removed = [path for path in states if path not in pdfs]
+            if removed:
+                index.remove(removed)
+                catalog.mark_content_changed()
+            tasks = [(path, self.max_pages, self.timeout) for path, state in pdfs.items()
+                     if states.get(path) != state]
+            if not tasks:
+                return
+
+            changed = []
+            last_flush = time.monotonic()
+            results = bounded_map(partial(new_pool, self.workers, self.memory_limit_mb), extract_content,
+                                  tasks, 2 * self.workers, canceled=lambda: self.canceled)
+            for (file_path, _, _), result in results:
+                text, error = result if result is not None else ("", "worker process died")
+                if error is not None:
+                    print(f"Erro ao extrair o texto de {file_path}: {error}")
+                size, mtime = pdfs[file_path]
+                index.update(file_path, size, mtime, text, commit=False)
+                changed.append(file_path)
+                indexed += 1
+
+                if len(changed) >= self.BATCH_SIZE or time.monotonic() - last_flush >= self.BATCH_INTERVAL:
+                    index.commit()
+                    catalog.mark_content_changed()
+                    changed = []
+                    last_flush = time.monotonic()
+                self.progress_updated.emit(int(100 * indexed / len(tasks)))
+            index.commit()
+            catalog.mark_content_changed()
+        except sqlite3.OperationalError as e:
+            print(f"Erro ao gravar o índice de conteúdo: {e}")
+        finally:
+            index.close()
+            if catalog is not None:
+                catalog.close()
+            self.indexing_finished.emit(indexed)
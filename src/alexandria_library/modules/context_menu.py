@@ -8,12 +8,12 @@ import json
 
 from .files   import open_folder_from_path
 from .files   import open_file_from_path
-from .files   import read_file_from_path
 from .message import show_message
-from .pdfs    import is_pdf
 from .pdfs    import get_metadata_pdf
 from .pdfs    import is_text_selectable
-from .bibtex  import get_bibtex_from_books
+from .bib_lookup import lookup_bibtex
+from .sidecar_store import read_bib, write_bib, write_ocr
+from .results_model import FLAG_BIB
 
 
 def generate_worldcat_search_link(book_title, offset=1):
@@ -23,8 +23,15 @@ def generate_worldcat_search_link(book_title, offset=1):
     url = f"https://search.worldcat.org/pt/search?q={encoded_title}&offset={offset}"
     return url
 
-def get_metadata_from_path(file_path):
-    metadata=get_metadata_pdf(file_path)
+def get_metadata_from_path(parent, file_path):
+    # Metadados já lidos em segundo plano (MetadataHarvester) abrem sem ler o PDF
+    stored = parent.catalog.pdf_metadata(file_path)
+    if stored is None:
+        metadata=get_metadata_pdf(file_path)
+    else:
+        metadata, pages = stored
+        if pages is not None:
+            metadata["Pages"] = pages
     metadata_str = json.dumps(metadata, indent=4, ensure_ascii=False)
         
     show_message(   metadata_str, 
@@ -37,12 +44,15 @@ def get_metadata_from_path(file_path):
     
 def save_bib_file(  parent,
                     bib_path,
-                    default_str, 
+                    default_str=None, 
                     width=600, 
                     height=300, 
                     read_only=False, 
                     title="Bib file"):
     
+    if default_str is None:
+        # Texto lido só quando a ação é escolhida
+        default_str = read_bib(bib_path[:-len('.bib')]) or ""
     res = show_message( default_str, 
                         width=width, 
                         height=height, 
@@ -51,9 +61,9 @@ def save_bib_file(  parent,
                         title=title,
                         show_close_button=True)
     if res!='':
-        with open(bib_path, 'w', encoding='utf-8') as arquivo:
-            arquivo.write(res)
-            parent.refresh()
+        # No .bib ou no arquivo único de metadados, se habilitado
+        write_bib(bib_path[:-len('.bib')], res)
+        parent.sidecar_changed(bib_path[:-len('.bib')])
 
 def search_bib_data(parent,
                     bib_file,
@@ -72,33 +82,106 @@ def search_bib_data(parent,
                         title=title,
                         show_close_button=True)
     if res!='':
-        parent.show_notification_message("Sending consult","Please wait...")
-        bib_str = get_bibtex_from_books(res)
+        parent.statusBar().showMessage(f"Searching the bib data of \"{res}\"...")
         
-        save_bib_file(  parent,
-                        bib_file,
-                        bib_str, 
-                        width=width, 
-                        height=height, 
-                        read_only=read_only, 
-                        title="Bib file")
+        # A busca roda fora da thread da interface; o diálogo abre quando terminar
+        def show_result(query, bib_str, error):
+            if error:
+                parent.statusBar().showMessage(f"Error searching the bib data: {error}")
+                return
+            parent.statusBar().clearMessage()
+            save_bib_file(  parent,
+                            bib_file,
+                            bib_str or "", 
+                            width=width, 
+                            height=height, 
+                            read_only=read_only, 
+                            title="Bib file")
+        
+        lookup_bibtex(res, show_result, cache=parent.bib_cache)
 
 def copy_to_clipboard(text):
     clipboard = QApplication.clipboard()
     clipboard.setText(text)
     # Não use app.exec_() se isto for parte de um script não-GUI
     
-def check_ocr_pdf(parent,file_path,data, max_pages_check=5):
-    data["ocr"] = is_text_selectable(file_path, max_pages_check=max_pages_check)
-    with open(file_path+'.json', 'w', encoding='utf-8') as arquivo:
-        json.dump(data, arquivo, indent=4, ensure_ascii=False)
-        parent.refresh()
+def check_ocr_pdf(parent,file_path, max_pages_check=5):
+    write_ocr(file_path, is_text_selectable(file_path, max_pages_check=max_pages_check))
+    parent.sidecar_changed(file_path)
     
+def show_bib_file(file_path):
+    # Texto lido só quando a ação é escolhida
+    show_message(   read_bib(file_path) or "", 
+                    width=600, 
+                    height=300, 
+                    read_only=False, 
+                    title="Bib file")
+
+def file_is_pdf(file_path, kind):
+    # Tipo em cache no índice; pela extensão se ainda não reconhecido
+    if kind:
+        return kind == "pdf"
+    return file_path.lower().endswith('.pdf')
+
+def show_batch_menu(parent, selected, pos):
+    """
+    Context menu of a multi-row selection: the actions run over all the
+    selected files at once, the slow ones as one background job (see
+    Alexandria.verify_ocr_files and Alexandria.fetch_bib_files) with a
+    single progress and the sidecars written in one batch at the end.
+    """
+    model = parent.table_view.model()
+    source_model = model.sourceModel()
+    # Estado das linhas em memória, como no menu de uma linha
+    infos = [source_model.file_info(model.mapToSource(index).row()) for index in selected]
+    file_paths = [file_path for file_path, _, _ in infos]
+    pdf_paths = [file_path for file_path, _, kind in infos if file_is_pdf(file_path, kind)]
+    without_bib = [file_path for file_path, flags, _ in infos if not flags & FLAG_BIB]
+
+    menu = QMenu()
+
+    copy_path_action = QAction(f"Copy {len(file_paths)} file paths", parent)
+    copy_path_action.setIcon(QIcon.fromTheme("edit-copy"))
+    copy_path_action.triggered.connect(lambda: copy_to_clipboard("\n".join(file_paths)))
+    menu.addAction(copy_path_action)
+
+    copy_basename_action = QAction(f"Copy {len(file_paths)} basenames", parent)
+    copy_basename_action.setIcon(QIcon.fromTheme("edit-copy"))
+    copy_basename_action.triggered.connect(
+        lambda: copy_to_clipboard("\n".join(os.path.basename(file_path) for file_path in file_paths)))
+    menu.addAction(copy_basename_action)
+
+    if parent.ocr_worker is not None and parent.ocr_worker.isRunning():
+        check_ocr_action = QAction("Stop the OCR verification", parent)
+        check_ocr_action.setIcon(QIcon.fromTheme("process-stop"))
+        check_ocr_action.triggered.connect(lambda: parent.verify_ocr_files(pdf_paths))
+        menu.addAction(check_ocr_action)
+    elif pdf_paths:
+        check_ocr_action = QAction(f"Verify OCR of {len(pdf_paths)} PDFs", parent)
+        check_ocr_action.setIcon(QIcon.fromTheme("insert-text"))
+        check_ocr_action.triggered.connect(lambda: parent.verify_ocr_files(pdf_paths))
+        menu.addAction(check_ocr_action)
+
+    if parent.bib_worker is not None and parent.bib_worker.isRunning():
+        search_bib_action = QAction("Stop the search of bib data", parent)
+        search_bib_action.setIcon(QIcon.fromTheme("process-stop"))
+        search_bib_action.triggered.connect(lambda: parent.fetch_bib_files(without_bib))
+        menu.addAction(search_bib_action)
+    elif without_bib:
+        search_bib_action = QAction(f"Search bib data of {len(without_bib)} files without bib", parent)
+        search_bib_action.setIcon(QIcon.fromTheme("system-search"))
+        search_bib_action.triggered.connect(lambda: parent.fetch_bib_files(without_bib))
+        menu.addAction(search_bib_action)
+
+    menu.exec_(parent.table_view.viewport().mapToGlobal(pos))
+
 def show_context_menu_from_index(parent, base_path, pos):
 
     selected = parent.table_view.selectionModel().selectedRows()
     
-    if len(selected) == 1 :
+    if len(selected) > 1:
+        show_batch_menu(parent, selected, pos)
+    elif len(selected) == 1 :
         index = parent.table_view.indexAt(pos)
         if not index.isValid():
             return
@@ -108,15 +191,8 @@ def show_context_menu_from_index(parent, base_path, pos):
 
         proxy_index = model.index(row, 0)
         source_index = model.mapToSource(proxy_index)
-        filename = model.sourceModel().itemFromIndex(source_index).text()
-        
-        
-        proxy_index = model.index(row, 1)
-        source_index = model.mapToSource(proxy_index)
-        rel_dir = model.sourceModel().itemFromIndex(source_index).text()
-
-
-        file_path = os.path.join(base_path,rel_dir,filename)
+        # Estado da linha em memória: o menu abre sem acessar o disco
+        file_path, flags, kind = model.sourceModel().file_info(source_index.row())
         
         menu = QMenu()
 
@@ -135,28 +211,19 @@ def show_context_menu_from_index(parent, base_path, pos):
         copy_basename_action.triggered.connect(lambda: copy_to_clipboard(os.path.basename(file_path)))
         menu.addAction(copy_basename_action)
         
-        if is_pdf(file_path):
+        pdf = file_is_pdf(file_path, kind)
+        if pdf:
             get_metadata_action = QAction("Get PDF metadata", parent)
             get_metadata_action.setIcon(QIcon.fromTheme("application-pdf"))
-            get_metadata_action.triggered.connect(lambda: get_metadata_from_path(file_path))
+            get_metadata_action.triggered.connect(lambda: get_metadata_from_path(parent, file_path))
             menu.addAction(get_metadata_action)
         
-
-        json_file = file_path + '.json'
-        if os.path.exists(file_path):
-            data = dict()
-            if os.path.exists(json_file):
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-            if is_pdf(file_path):    
-                check_ocr_action = QAction("Verify OCR", parent)
-                check_ocr_action.setIcon(QIcon.fromTheme("insert-text"))
-                check_ocr_action.triggered.connect(lambda: check_ocr_pdf(   parent, 
-                                                                            file_path, 
-                                                                            data, 
-                                                                            max_pages_check=5))
-                menu.addAction(check_ocr_action)
+            check_ocr_action = QAction("Verify OCR", parent)
+            check_ocr_action.setIcon(QIcon.fromTheme("insert-text"))
+            check_ocr_action.triggered.connect(lambda: check_ocr_pdf(   parent, 
+                                                                        file_path, 
+                                                                        max_pages_check=5))
+            menu.addAction(check_ocr_action)
         
         bib_file = file_path + '.bib'
 
@@ -171,23 +238,17 @@ def show_context_menu_from_index(parent, base_path, pos):
                                                                     title="Info of file"))
         menu.addAction(search_bib_action)
 
-        bib_str = ""
-        if os.path.exists(bib_file) and os.path.exists(file_path):
-            bib_str = read_file_from_path(bib_file)
+        if flags & FLAG_BIB:
             open_bib_action = QAction("Show bib file", parent)
             open_bib_action.setIcon(QIcon.fromTheme("text-x-generic"))
-            open_bib_action.triggered.connect(lambda: show_message( bib_str, 
-                                                                    width=600, 
-                                                                    height=300, 
-                                                                    read_only=False, 
-                                                                    title="Bib file"))
+            open_bib_action.triggered.connect(lambda: show_bib_file(file_path))
             menu.addAction(open_bib_action)
 
         create_bib_action = QAction("Create/Edit bib file", parent)
         create_bib_action.setIcon(QIcon.fromTheme("text-x-generic"))
         create_bib_action.triggered.connect(lambda: save_bib_file(  parent,
                                                                     bib_file,
-                                                                    bib_str, 
+                                                                    None if flags & FLAG_BIB else "", 
                                                                     width=600, 
                                                                     height=300, 
                                                                     read_only=False, 
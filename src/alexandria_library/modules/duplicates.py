@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from alexandria_library.modules.catalog import LibraryCatalog
+from alexandria_library.modules.results_model import record_flags
+
+# Bytes lidos do início e do fim de cada arquivo na segunda etapa
+EDGE_SIZE = 64 * 1024
+
+# Tamanho do buffer do hash completo
+BUFFER_SIZE = 1024 * 1024
+
+def edge_hash(file_path, size):
+    """Hashes the first and the last EDGE_SIZE bytes of a file (the whole file if small)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(EDGE_SIZE))
+        if size > EDGE_SIZE:
+            f.seek(max(EDGE_SIZE, size - EDGE_SIZE))
+            digest.update(f.read(EDGE_SIZE))
+    return digest.digest()
+
+def full_hash(file_path):
+    """Hashes the whole file with large buffered reads (hashlib releases the GIL)."""
+    digest = hashlib.blake2b(digest_size=32)
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.digest()
+
+def _regroup(groups, key_func, executor, canceled, progress=None):
+    """
+    Splits each group of (path, size) by key_func(path, size), computed in
+    the executor; returns the new groups with more than one file.
+    """
+    items = [item for group in groups for item in group]
+    keys = {}
+    futures = {executor.submit(key_func, path, size): (path, size) for path, size in items}
+    for i, (future, item) in enumerate(futures.items()):
+        if canceled():
+            for pending in futures:
+                pending.cancel()
+            return []
+        try:
+            keys[item] = future.result()
+        except OSError:
+            continue    # arquivo removido ou ilegível
+        if progress is not None:
+            progress(i + 1, len(items))
+
+    new_groups = []
+    for group in groups:
+        buckets = {}
+        for item in group:
+            if item in keys:
+                buckets.setdefault(keys[item], []).append(item)
+        new_groups.extend(bucket for bucket in buckets.values() if len(bucket) > 1)
+    return new_groups
+
+def find_duplicates(files, workers=8, canceled=lambda: False, progress=None):
+    """
+    Finds the groups of files with identical content in three stages, each
+    one only over the candidates left by the previous one:
+
+    1. files are bucketed by size (no I/O; empty files are ignored)
+    2. same-size files are bucketed by the hash of their first and last
+       EDGE_SIZE bytes
+    3. the remaining files are fully hashed, unless the second stage
+       already covered their whole content
+
+    The hashes are computed by a pool of threads.
+
+    Parameters:
+    - files (list): Tuples (path, size)
+    - workers (int, optional): Number of threads
+    - canceled (callable, optional): Returns True to stop
+    - progress (callable, optional): Called with (stage, done, total)
+
+    Returns:
+    - list: Groups (lists of paths) of duplicated files, the groups wasting
+      more space first
+    """
+    by_size = {}
+    for path, size in files:
+        if size:
+            by_size.setdefault(size, []).append((path, size))
+    groups = [group for group in by_size.values() if len(group) > 1]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        report = (lambda done, total: progress(2, done, total)) if progress else None
+        groups = _regroup(groups, edge_hash, executor, canceled, report)
+
+        # Até 2*EDGE_SIZE bytes, o hash das pontas já cobriu o arquivo inteiro
+        small = [group for group in groups if group[0][1] <= 2 * EDGE_SIZE]
+        large = [group for group in groups if group[0][1] > 2 * EDGE_SIZE]
+        report = (lambda done, total: progress(3, done, total)) if progress else None
+        large = _regroup(large, lambda path, size: full_hash(path), executor, canceled, report)
+
+    groups = small + large
+    groups.sort(key=lambda group: (-group[0][1] * (len(group) - 1), group[0][0]))
+    return [sorted(path for path, _ in group) for group in groups]
+
+class DuplicateWorker(QThread):
+    """
+    Finds the duplicated files of a directory subtree (see find_duplicates)
+    outside the GUI thread, taking the file sizes from the catalog.
+
+    Signals:
+    - progress_updated: Emits the progress percentage
+    - duplicates_found: Emits (records, groups, wasted), where records are
+      the (file_path, flags) of the duplicated files, group by group,
+      groups are the group number of each record and wasted is the number
+      of bytes used by the extra copies
+    """
+
+    progress_updated = pyqtSignal(int)
+    duplicates_found = pyqtSignal(list, list, object)
+
+    def __init__(self, root_dir, catalog_path, workers=8):
+        super().__init__()
+        self.root_dir = os.path.normpath(root_dir)
+        self.catalog_path = catalog_path
+        self.workers = workers
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def _progress(self, stage, done, total):
+        # Etapa 2 (pontas) até 50%, etapa 3 (hash completo) de 50% a 100%
+        self.progress_updated.emit(int(50 * (stage - 2) + 50 * done / total))
+
+    def run(self):
+        catalog = None
+        try:
+            catalog = LibraryCatalog(self.catalog_path)
+            catalog.rescan(self.root_dir, canceled=lambda: self.canceled)
+            files = catalog.list_file_sizes(self.root_dir)
+            found = find_duplicates(files, self.workers, canceled=lambda: self.canceled,
+                                    progress=self._progress)
+            if self.canceled:
+                return
+            sizes = dict(files)
+            records = []
+            groups = []
+            wasted = 0
+            for number, group in enumerate(found):
+                wasted += sizes[group[0]] * (len(group) - 1)
+                for path in group:
+                    state = catalog.file_state(path)
+                    records.append((path, record_flags(*state) if state is not None else 0))
+                    groups.append(number)
+            self.duplicates_found.emit(records, groups, wasted)
+        except sqlite3.OperationalError as e:
+            print(f"Erro ao ler o catálogo: {e}")
+        finally:
+            if catalog is not None:
+                catalog.close()
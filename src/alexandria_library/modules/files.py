@@ -34,13 +34,7 @@ def open_file_from_index(parent,base_path,index):
 
         proxy_index = model.index(row, 0)
         source_index = model.mapToSource(proxy_index)
-        filename = model.sourceModel().itemFromIndex(source_index).text()
-        
-        proxy_index = model.index(row, 1)
-        source_index = model.mapToSource(proxy_index)
-        rel_dir = model.sourceModel().itemFromIndex(source_index).text()
-
-        file_path = os.path.join(base_path,rel_dir,filename)
+        file_path = model.sourceModel().file_path(source_index.row())
             
         open_file_from_path(file_path)
 
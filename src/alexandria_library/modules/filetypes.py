@@ -1,14 +1,37 @@
 import filetype
 # pip install filetype
 
+# Bytes do início do arquivo lidos para reconhecer o tipo (o mesmo limite do filetype)
+HEADER_SIZE = 8192
+
 def type_of_file(filepath):
     kind = filetype.guess(filepath)
     if kind is None:
         return "Tipo desconhecido ou não suportado"
     return (kind.extension, kind.mime)
 
+def type_of_header(header):
+    """
+    Returns the type (the usual extension, e.g. "pdf", "epub", "zip") of
+    a file from its first bytes, or "" if unknown.
+    """
+    kind = filetype.guess(header)
+    return kind.extension if kind is not None else ""
+
+def sniff_file_type(filepath):
+    """
+    Reads the first HEADER_SIZE bytes of a file once and returns its type
+    (see type_of_header), or None if the file can't be read.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    return type_of_header(header)
+
 # Exemplo de uso
 if __name__ == "__main__":
     pdf_path = "/mnt/boveda/DATASHEET/GDS-806810.pdf"
-    
-    print(type_of_file(pdf_path)[1])  
+
+    print(type_of_file(pdf_path)[1])
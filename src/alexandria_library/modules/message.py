@@ -2,9 +2,12 @@ from PyQt5.QtWidgets import QDialog, QVBoxLayout, QTextEdit, QScrollArea, QPushB
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon
 
+# Resultado do diálogo quando o botão Discard é pressionado
+DISCARDED = 2
+
 class MessageDialog(QDialog):
     """Display a message with copyable text and configurable buttons"""
-    def __init__(self, message, width=600, height=300, parent=None, read_only=False, ok_label='OK', title="Message", show_close_button=False):
+    def __init__(self, message, width=600, height=300, parent=None, read_only=False, ok_label='OK', title="Message", show_close_button=False, show_discard_button=False):
         super().__init__(parent)
         self.setWindowTitle(title)
         self.resize(width, height)
@@ -40,6 +43,13 @@ class MessageDialog(QDialog):
         ok_button.clicked.connect(self.accept)
         button_layout.addWidget(ok_button)
         
+        # Discard Button (optional)
+        if show_discard_button:
+            discard_button = QPushButton("Discard")
+            discard_button.setIcon(QIcon.fromTheme("edit-delete"))
+            discard_button.clicked.connect(lambda: self.done(DISCARDED))
+            button_layout.addWidget(discard_button)
+        
         # Close Button (optional)
         if show_close_button:
             close_button = QPushButton("Close")
@@ -61,18 +71,23 @@ def show_message(   message,
                     read_only=False, 
                     ok_label='OK', 
                     title="Message", 
-                    show_close_button=False):
+                    show_close_button=False,
+                    show_discard_button=False):
     dialog = MessageDialog( message, 
                             width, 
                             height, 
                             read_only=read_only, 
                             ok_label=ok_label, 
                             title=title, 
-                            show_close_button=show_close_button)
+                            show_close_button=show_close_button,
+                            show_discard_button=show_discard_button)
     result = dialog.exec_()
     
     # If Close button is pressed (rejected), return empty string
+    # If Discard button is pressed, return None
     # If OK button is pressed (accepted), return the text
+    if result == DISCARDED:
+        return None
     if result == QDialog.Rejected:
         return ""
     return dialog.text_edit.toPlainText()
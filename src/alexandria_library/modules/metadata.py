@@ -0,0 +1,118 @@
+import os
+import time
+import sqlite3
+from functools import partial
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from alexandria_library.modules.catalog import LibraryCatalog
+from alexandria_library.modules.pdfs import read_pdf_metadata
+from alexandria_library.modules.process_pool import new_pool, call_with_timeout, bounded_map
+from alexandria_library.modules.search_index import get_search_index
+
+def harvest_pdf(file_path, timeout=0):
+    """
+    Reads the metadata of one PDF in a pool process.
+
+    Returns:
+    - tuple: (info, pages, error); on errors info is {} and pages is None
+    """
+    try:
+        info, pages = call_with_timeout(timeout, read_pdf_metadata, file_path)
+        return info, pages, None
+    except MemoryError:
+        return {}, None, "memory limit"
+    except Exception as e:
+        return {}, None, str(e) or type(e).__name__
+
+class MetadataHarvester(QThread):
+    """
+    Reads in background the /Info metadata (Title, Author, CreationDate...)
+    and the number of pages of all the PDFs of a directory subtree into
+    the catalog, with a pool of processes.
+
+    Only the PDFs whose stored metadata is missing or older than the file
+    (by size and mtime) are read. The PDFs that can't be read are stored
+    with empty metadata, so they are only tried again when they change.
+    After each batch the shared SearchIndex is synchronized, so the
+    metadata becomes searchable without opening any PDF at query time.
+
+    Signals:
+    - progress_updated: Emits the percentage of read files
+    - harvest_finished: Emits the number of read files
+    """
+
+    BATCH_SIZE = 100
+    BATCH_INTERVAL = 2.0
+
+    progress_updated = pyqtSignal(int)
+    harvest_finished = pyqtSignal(int)
+
+    def __init__(self, root_dir, catalog_path, workers=2, timeout=30, memory_limit_mb=1024, rescan=True):
+        """
+        Parameters:
+        - root_dir (str): Directory whose subtree is read
+        - catalog_path (str): Path of the SQLite catalog
+        - workers (int, optional): Number of processes. Defaults to 2, to
+          leave the machine free while the program is used.
+        - timeout (float, optional): Maximum time (s) per file; 0 disables it
+        - memory_limit_mb (int, optional): Address space limit of each
+          process in MiB; 0 disables it
+        - rescan (bool, optional): Rescan the catalog first; False if it is
+          kept up to date by a LibraryWatcher
+        """
+        super().__init__()
+        self.root_dir = os.path.normpath(root_dir)
+        self.catalog_path = catalog_path
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.rescan = rescan
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def run(self):
+        index = get_search_index(self.catalog_path)
+        harvested = 0
+        catalog = None
+        try:
+            catalog = LibraryCatalog(self.catalog_path)
+            if self.rescan:
+                catalog.rescan(self.root_dir, canceled=lambda: self.canceled)
+            tasks = catalog.list_pdfs_without_metadata(self.root_dir)
+            total = len(tasks)
+            if not total:
+                return
+
+            pending_commit = 0
+            last_flush = time.monotonic()
+            results = bounded_map(partial(new_pool, self.workers, self.memory_limit_mb), harvest_pdf,
+                                  [(path, self.timeout) for path, _, _ in tasks],
+                                  2 * self.workers, canceled=lambda: self.canceled)
+            stats = {path: (size, mtime) for path, size, mtime in tasks}
+            for (file_path, _), result in results:
+                info, pages, error = result if result is not None else ({}, None, "worker process died")
+                if error is not None:
+                    print(f"Erro ao ler os metadados de {file_path}: {error}")
+                size, mtime = stats[file_path]
+                catalog.store_pdf_metadata(file_path, size, mtime, info, pages, commit=False)
+                harvested += 1
+                pending_commit += 1
+
+                if pending_commit >= self.BATCH_SIZE or time.monotonic() - last_flush >= self.BATCH_INTERVAL:
+                    catalog.commit()
+                    index.sync(catalog)
+                    pending_commit = 0
+                    last_flush = time.monotonic()
+                self.progress_updated.emit(int(100 * harvested / total))
+            catalog.commit()
+            index.sync(catalog)
+        except sqlite3.OperationalError as e:
+            # Os metadados não gravados são lidos de novo na próxima coleta
+            print(f"Erro ao gravar no catálogo: {e}")
+        finally:
+            if catalog is not None:
+                catalog.close()
+            self.harvest_finished.emit(harvested)
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import sqlite3
+from functools import partial
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from alexandria_library.modules.catalog import LibraryCatalog
+from alexandria_library.modules.pdfs import is_pdf, has_text_layer
+from alexandria_library.modules.process_pool import new_pool, call_with_timeout, bounded_map
+from alexandria_library.modules.results_model import record_flags
+from alexandria_library.modules.sidecar_store import write_ocr, commit_sidecars
+
+def check_pdf(file_path, max_pages_check=5, timeout=0):
+    """
+    Checks the text layer of one PDF in a pool process.
+
+    Returns:
+    - tuple: (ocr, error), where ocr is True/False, or None if the file
+      could not be checked, and error describes why
+    """
+    try:
+        if not is_pdf(file_path):
+            return None, "not a PDF"
+        return call_with_timeout(timeout, has_text_layer, file_path, max_pages_check=max_pages_check), None
+    except TimeoutError as e:
+        return None, str(e)
+    except MemoryError:
+        return None, "memory limit"
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+class OcrJournal:
+    """
+    Append-only journal of the files already checked by an interrupted
+    OCR job (one JSON object per line), so the next job over the same
+    files skips them. The files whose check failed (timeout, memory limit,
+    broken PDF) are also skipped, instead of failing again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}      # file path -> mtime of the file when checked
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.done[entry["path"]] = entry["mtime"]
+                    except (ValueError, KeyError, TypeError):
+                        continue    # última linha incompleta
+        except OSError:
+            pass
+
+    def is_done(self, file_path, mtime):
+        return self.done.get(file_path) == mtime
+
+    def append(self, entries):
+        """Appends dicts with at least "path" and "mtime" and syncs the file."""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.done[entry["path"]] = entry["mtime"]
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.done = {}
+
+class OcrBatchWorker(QThread):
+    """
+    Verifies the OCR (text layer) of all the PDFs of a directory subtree
+    with a pool of processes, outside the GUI thread.
+
+    Only the PDFs without a known "ocr" value in a .json sidecar newer
+    than the PDF are checked (see LibraryCatalog.list_unverified_pdfs).
+    Each check runs with a timeout (SIGALRM) and each process with a
+    limit of address space (RLIMIT_AS), see process_pool, so a huge or broken PDF can't
+    stall or exhaust the machine. The results are written to the sidecars
+    and to the catalog in batches, and recorded in an OcrJournal; if the
+    job is interrupted, the next one resumes where it stopped. The
+    journal is removed when a job completes.
+
+    A job can also be given a list of files instead (e.g. the rows selected
+    in the table): then all the PDFs among them are checked, even the
+    verified ones, without journal, and the results are written in a
+    single batch at the end (also when canceled).
+
+    Signals:
+    - progress_updated: Emits the percentage of checked files
+    - batch_written: Emits the (file_path, flags) records of each written
+      batch, with the flags of results_model
+    - job_finished: Emits (number of checked files, number of failures)
+    """
+
+    BATCH_SIZE = 50
+    BATCH_INTERVAL = 2.0
+
+    progress_updated = pyqtSignal(int)
+    batch_written = pyqtSignal(list)
+    job_finished = pyqtSignal(int, int)
+
+    def __init__(self, root_dir, catalog_path, workers=None, timeout=60, memory_limit_mb=1024,
+                 max_pages_check=5, files=None):
+        """
+        Parameters:
+        - root_dir (str): Directory whose subtree is verified
+        - catalog_path (str): Path of the SQLite catalog; the journal is
+          kept in the same directory
+        - workers (int, optional): Number of processes. Defaults to the number of CPUs.
+        - timeout (float, optional): Maximum time (s) per file; 0 disables it
+        - memory_limit_mb (int, optional): Address space limit of each
+          process in MiB; 0 disables it
+        - max_pages_check (int, optional): Number of pages checked per file
+        - files (list, optional): Paths of the files to check instead of the
+          subtree of root_dir
+        """
+        super().__init__()
+        self.root_dir = os.path.normpath(root_dir)
+        self.catalog_path = catalog_path
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_pages_check = max_pages_check
+        self.files = files
+        self.journal_path = os.path.join(os.path.dirname(catalog_path), "ocr_journal.jsonl")
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def run(self):
+        # Uma seleção é verificada de uma vez, sem retomada
+        journal = OcrJournal(self.journal_path) if self.files is None else None
+        checked = failed = 0
+        catalog = None
+        try:
+            catalog = LibraryCatalog(self.catalog_path)
+            if self.files is None:
+                catalog.rescan(self.root_dir, canceled=lambda: self.canceled)
+                file_paths = catalog.list_unverified_pdfs(self.root_dir)
+            else:
+                file_paths = [path for path, _, kind, _ in catalog.list_files_info(self.files)
+                              if kind == "pdf" or (not kind and path.lower().endswith('.pdf'))]
+            mtimes = {}
+            for file_path in file_paths:
+                try:
+                    mtime = os.stat(file_path).st_mtime
+                except OSError:
+                    continue
+                if journal is None or not journal.is_done(file_path, mtime):
+                    mtimes[file_path] = mtime
+            total = len(mtimes)
+
+            batch = []
+            last_flush = time.monotonic()
+            # Poucas tarefas em voo, para o cancelamento ser rápido
+            results = bounded_map(partial(new_pool, self.workers, self.memory_limit_mb), check_pdf,
+                                  [(file_path, self.max_pages_check, self.timeout) for file_path in mtimes],
+                                  2 * self.workers, canceled=lambda: self.canceled)
+            for (file_path, _, _), result in results:
+                ocr, error = result if result is not None else (None, "worker process died")
+                batch.append((file_path, ocr, error))
+                checked += 1
+                failed += ocr is None
+
+                if journal is not None and (len(batch) >= self.BATCH_SIZE or
+                                            time.monotonic() - last_flush >= self.BATCH_INTERVAL):
+                    self._write_batch(catalog, journal, batch, mtimes)
+                    batch = []
+                    last_flush = time.monotonic()
+                self.progress_updated.emit(int(100 * checked / total))
+            if batch:
+                self._write_batch(catalog, journal, batch, mtimes)
+            if journal is not None and not self.canceled:
+                journal.remove()
+        except sqlite3.OperationalError as e:
+            # O diário permite retomar a verificação depois
+            print(f"Erro ao gravar no catálogo: {e}")
+        finally:
+            if catalog is not None:
+                catalog.close()
+            self.job_finished.emit(checked, failed)
+
+    def _write_batch(self, catalog, journal, batch, mtimes):
+        """Writes the sidecars, the catalog (one transaction) and the journal of a batch."""
+        records = []
+        entries = []
+        for file_path, ocr, error in batch:
+            entry = {"path": file_path, "mtime": mtimes[file_path]}
+            if ocr is None:
+                print(f"OCR not verified for {file_path}: {error}")
+                entry["error"] = error
+            else:
+                try:
+                    write_ocr(file_path, ocr, commit=False)
+                except OSError as e:
+                    print(f"Erro ao salvar {file_path}.json: {e}")
+                    continue
+                catalog.update_ocr(file_path, commit=False)
+                entry["ocr"] = ocr
+                state = catalog.file_state(file_path)
+                if state is not None:
+                    records.append((file_path, record_flags(*state)))
+            entries.append(entry)
+        commit_sidecars()
+        catalog.commit()
+        if journal is not None:
+            journal.append(entries)
+        if records:
+            self.batch_written.emit(records)
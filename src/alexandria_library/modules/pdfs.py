@@ -1,25 +1,160 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
 import PyPDF2
 # pip install PyPDF2
 from typing import Dict, Any
 
 from PyPDF2 import PdfReader
 
-def is_text_selectable(filepath, max_pages_check=5):
-    has_text = False
-    try:
-        reader = PdfReader(filepath)
-        # Verifica apenas as primeiras 'max_pages_check' páginas
+# Operadores de texto de um content stream: BT ... (Tj | TJ | ' | ") ... ET
+TEXT_BLOCK_RE = re.compile(rb"(?:^|[\s\]\)>])BT(?:[\s\[\(<\/]|$)")
+SHOW_TEXT_RE = re.compile(rb"(?:[\)\]>]\s*|\s)(?:Tj|TJ|'|\")(?=[\s\[\(<\/]|$)")
+SUBTYPE_RE = re.compile(rb"/Subtype\s*/(\w+)")
+STARTXREF_RE = re.compile(rb"startxref\s+(\d+)\s+%%EOF", re.S)
+
+# ioctl do Linux que clona um arquivo sem copiar os dados (btrfs, xfs...)
+FICLONE = 0x40049409
+
+# Resultados de has_text_layer por arquivo, válidos enquanto (tamanho, mtime) não mudam
+TEXT_LAYER_CACHE_SIZE = 4096
+_text_layer_cache = OrderedDict()
+_text_layer_lock = threading.Lock()
+
+def _stream_data(obj):
+    obj = obj.get_object()
+    if isinstance(obj, PyPDF2.generic.ArrayObject):
+        return b"\n".join(_stream_data(item) for item in obj)
+    return obj.get_data()
+
+def _xobject_subtype(reader, ref):
+    """
+    Returns the /Subtype of an XObject reading only the start of its
+    dictionary, since resolving it would read the whole (image) stream.
+    """
+    if isinstance(ref, PyPDF2.generic.IndirectObject):
+        offset = reader.xref.get(ref.generation, {}).get(ref.idnum)
+        if offset is not None:
+            reader.stream.seek(offset)
+            head = reader.stream.read(1024).split(b"stream", 1)[0]
+            match = SUBTYPE_RE.search(head)
+            if match:
+                return "/" + match.group(1).decode('latin-1')
+    return ref.get_object().get("/Subtype")
+
+def _resource_fonts(reader, resources, depth=0):
+    """
+    Returns (has_fonts, has_forms): whether the resources declare fonts,
+    directly or in Form XObjects, and whether there are Form XObjects
+    (whose content streams may also show text).
+    """
+    if resources is None or depth > 3:
+        return False, False
+    resources = resources.get_object()
+    if resources.get("/Font"):
+        return True, False
+    has_forms = False
+    xobjects = resources.get("/XObject")
+    if xobjects:
+        for ref in xobjects.get_object().values():
+            if _xobject_subtype(reader, ref) != "/Form":
+                continue
+            has_forms = True
+            fonts, _ = _resource_fonts(reader, ref.get_object().get("/Resources"), depth + 1)
+            if fonts:
+                return True, True
+    return False, has_forms
+
+def quick_text_layer(filepath, max_pages_check=5):
+    """
+    Fast check of the text layer of a PDF, looking only at the resource
+    dictionaries (fonts) and the content streams (text operators) of the
+    first pages. The file is read lazily, so the image streams of scanned
+    pages are never read nor decoded.
+
+    Returns:
+    - bool or None: True if a page shows text with a font, False if no
+      page declares fonts nor text operators, None if ambiguous
+    """
+    with open(filepath, 'rb') as f:
+        reader = PdfReader(f, strict=False)
+        ambiguous = False
         for i, page in enumerate(reader.pages):
             if i >= max_pages_check:
                 break
-            text = page.extract_text()
-            if text and text.strip():  # Se extrair texto não vazio
-                has_text = True
+            has_fonts, has_forms = _resource_fonts(reader, page.get("/Resources"))
+            contents = page.get("/Contents")
+            data = _stream_data(contents) if contents is not None else b""
+            has_text_ops = TEXT_BLOCK_RE.search(data) is not None
+            if has_fonts and has_text_ops and SHOW_TEXT_RE.search(data):
+                return True
+            if has_fonts or has_text_ops or has_forms:
+                # Texto vazio, só em Form XObjects, fontes herdadas...
+                ambiguous = True
+        return None if ambiguous else False
+
+def has_text_layer(filepath, max_pages_check=5, fast=True):
+    """
+    Returns True if one of the first max_pages_check pages has extractable
+    text. Unlike is_text_selectable, errors reading the PDF are raised.
+
+    With fast=True, quick_text_layer() is tried first and the text is only
+    extracted when its answer is ambiguous. The results are cached by the
+    (size, mtime) of the file.
+    """
+    st = os.stat(filepath)
+    key = (st.st_size, st.st_mtime)
+    with _text_layer_lock:
+        cached = _text_layer_cache.get((filepath, max_pages_check))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    result = quick_text_layer(filepath, max_pages_check) if fast else None
+    if result is None:
+        result = _extract_text_layer(filepath, max_pages_check)
+
+    with _text_layer_lock:
+        _text_layer_cache[(filepath, max_pages_check)] = (key, result)
+        _text_layer_cache.move_to_end((filepath, max_pages_check))
+        while len(_text_layer_cache) > TEXT_LAYER_CACHE_SIZE:
+            _text_layer_cache.popitem(last=False)
+    return result
+
+def _extract_text_layer(filepath, max_pages_check):
+    reader = PdfReader(filepath)
+    # Verifica apenas as primeiras 'max_pages_check' páginas
+    for i, page in enumerate(reader.pages):
+        if i >= max_pages_check:
+            break
+        text = page.extract_text()
+        if text and text.strip():  # Se extrair texto não vazio
+            return True
+    return False
+
+def extract_pdf_text(filepath, max_pages, pages_text):
+    """
+    Extracts the text of the first max_pages pages of a PDF, appending the
+    text of each page to the list pages_text as soon as it is extracted
+    (so the pages already read survive an interruption). Errors are raised.
+    """
+    with open(filepath, 'rb') as arquivo:
+        reader = PdfReader(arquivo, strict=False)
+        for i, page in enumerate(reader.pages):
+            if i >= max_pages:
                 break
+            pages_text.append(page.extract_text() or "")
+
+def is_text_selectable(filepath, max_pages_check=5):
+    try:
+        return has_text_layer(filepath, max_pages_check=max_pages_check)
     except Exception as e:
         print(f"Erro ao processar PDF: {e}")
         return False
-    return has_text
 
 def is_pdf(filepath):
     try:
@@ -29,10 +164,134 @@ def is_pdf(filepath):
     except:
         return False
 
+def _copy_file(origem, destino):
+    """Copies origem over destino, cloning it when the filesystem allows."""
+    try:
+        import fcntl
+        with open(origem, 'rb') as src, open(destino, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except (ImportError, OSError):
+        # Sem clonagem: cópia feita pelo kernel (sendfile), em blocos
+        shutil.copyfile(origem, destino)
+    shutil.copymode(origem, destino)
+
+def _last_startxref(arquivo):
+    """Returns the offset of the last cross-reference section, or None."""
+    arquivo.seek(0, os.SEEK_END)
+    tamanho = arquivo.tell()
+    arquivo.seek(max(0, tamanho - 1024))
+    matches = STARTXREF_RE.findall(arquivo.read())
+    return int(matches[-1]) if matches else None
+
+def atualizar_metadados_incremental(caminho_pdf: str, novos_metadados: Dict[str, Any], caminho_saida: str = None) -> bool:
+    """
+    Modifica os metadados de um PDF com uma atualização incremental: um novo
+    dicionário /Info, uma seção xref e um trailer são acrescentados ao fim
+    do arquivo, sem reescrever as páginas.
+
+    Sem caminho_saida, a atualização é acrescentada ao próprio arquivo
+    (seguida de fsync); se a escrita falhar, o arquivo é truncado de volta ao
+    tamanho original. Com caminho_saida, ou se o arquivo não puder ser aberto
+    para escrita, o PDF é copiado (clonado quando o sistema de arquivos
+    permite) para um temporário, que recebe a atualização e é renomeado
+    atomicamente sobre o destino.
+
+    Só funciona com PDFs não criptografados cuja última seção xref é uma
+    tabela clássica; nos outros casos retorna False sem modificar nada.
+
+    Parâmetros: os mesmos de modificar_metadados_pdf
+
+    Retorna:
+    bool: True se a atualização foi escrita, False se não é possível
+    """
+    with open(caminho_pdf, 'rb') as arquivo:
+        leitor_pdf = PdfReader(arquivo, strict=False)
+        if leitor_pdf.is_encrypted:
+            return False
+        startxref = _last_startxref(arquivo)
+        if startxref is None:
+            return False
+        arquivo.seek(startxref)
+        if not arquivo.read(4) == b"xref":
+            # Streams de xref (PDF 1.5+) pedem uma atualização no mesmo formato
+            return False
+
+        trailer = leitor_pdf.trailer
+        tamanho = int(trailer["/Size"])
+        metadados = PyPDF2.generic.DictionaryObject()
+        if "/Info" in trailer:
+            metadados.update(trailer["/Info"].get_object())
+        for chave, valor in novos_metadados.items():
+            metadados[PyPDF2.generic.NameObject(chave)] = PyPDF2.generic.TextStringObject(str(valor))
+
+        novo_trailer = PyPDF2.generic.DictionaryObject()
+        novo_trailer[PyPDF2.generic.NameObject("/Size")] = PyPDF2.generic.NumberObject(tamanho + 1)
+        novo_trailer[PyPDF2.generic.NameObject("/Root")] = trailer.raw_get("/Root")
+        novo_trailer[PyPDF2.generic.NameObject("/Info")] = PyPDF2.generic.IndirectObject(tamanho, 0, leitor_pdf)
+        novo_trailer[PyPDF2.generic.NameObject("/Prev")] = PyPDF2.generic.NumberObject(startxref)
+        if "/ID" in trailer:
+            novo_trailer[PyPDF2.generic.NameObject("/ID")] = trailer.raw_get("/ID")
+
+        arquivo.seek(-1, os.SEEK_END)
+        termina_com_linha = arquivo.read(1) in (b"\n", b"\r")
+
+    def escrever_atualizacao(saida):
+        saida.seek(0, os.SEEK_END)
+        if not termina_com_linha:
+            saida.write(b"\n")
+        offset = saida.tell()
+        saida.write(b"%d 0 obj\n" % tamanho)
+        metadados.write_to_stream(saida, None)
+        saida.write(b"\nendobj\n")
+        xref = saida.tell()
+        # A subseção do objeto 0 evita que leitores "corrijam" a numeração
+        saida.write(b"xref\n0 1\n0000000000 65535 f \n%d 1\n%010d 00000 n \n" % (tamanho, offset))
+        saida.write(b"trailer\n")
+        novo_trailer.write_to_stream(saida, None)
+        saida.write(b"\nstartxref\n%d\n%%%%EOF\n" % xref)
+        saida.flush()
+        os.fsync(saida.fileno())
+
+    caminho_final = caminho_saida or caminho_pdf
+    if os.path.abspath(caminho_final) == os.path.abspath(caminho_pdf):
+        try:
+            saida = open(caminho_pdf, 'r+b')
+        except OSError as e:
+            print(f"Não foi possível abrir {caminho_pdf} para escrita, usando uma cópia: {e}")
+        else:
+            with saida:
+                tamanho_original = os.fstat(saida.fileno()).st_size
+                try:
+                    escrever_atualizacao(saida)
+                except BaseException:
+                    # Desfaz o acréscimo parcial: o arquivo volta a ser o original
+                    saida.truncate(tamanho_original)
+                    saida.flush()
+                    os.fsync(saida.fileno())
+                    raise
+            return True
+
+    descritor, temporario = tempfile.mkstemp(prefix=".", suffix=".pdf.tmp",
+                                             dir=os.path.dirname(os.path.abspath(caminho_final)))
+    os.close(descritor)
+    try:
+        _copy_file(caminho_pdf, temporario)
+        with open(temporario, 'r+b') as saida:
+            escrever_atualizacao(saida)
+        os.replace(temporario, caminho_final)
+    except BaseException:
+        os.remove(temporario)
+        raise
+    return True
+
 def modificar_metadados_pdf(caminho_pdf: str, novos_metadados: Dict[str, Any], caminho_saida: str = None) -> bool:
     """
     Modifica os metadados de um arquivo PDF.
 
+    Tenta primeiro a atualização incremental (atualizar_metadados_incremental),
+    cujo custo não depende do tamanho do PDF; se ela não for possível, o PDF
+    inteiro é reescrito.
+
     Parâmetros:
     caminho_pdf (str): Caminho do arquivo PDF original
     novos_metadados (dict): Dicionário com novos metadados a serem modificados
@@ -42,6 +301,15 @@ def modificar_metadados_pdf(caminho_pdf: str, novos_metadados: Dict[str, Any], c
     Retorna:
     bool: True se a modificação foi bem-sucedida, False caso contrário
     """
+    try:
+        if atualizar_metadados_incremental(caminho_pdf, novos_metadados, caminho_saida):
+            return True
+    except FileNotFoundError:
+        print(f"Erro: Arquivo não encontrado em {caminho_pdf}")
+        return False
+    except Exception as e:
+        print(f"Atualização incremental falhou, reescrevendo o PDF: {e}")
+
     try:
         # Abre o arquivo PDF em modo de leitura binária
         with open(caminho_pdf, 'rb') as arquivo:
@@ -118,6 +386,37 @@ def get_metadata_pdf(caminho_pdf):
         print(f"Erro inesperado: {e}")
         return default_dict
 
+# Entradas do /Info indexadas para a busca
+METADATA_SEARCH_KEYS = ("/Title", "/Author", "/Subject", "/Keywords")
+
+def parse_metadata_json(info_json):
+    """Returns the /Info dict of the JSON stored in the catalog ({} if None)."""
+    if not info_json:
+        return {}
+    try:
+        return json.loads(info_json)
+    except ValueError:
+        return {}
+
+def metadata_text(info):
+    """Returns the searchable text of a /Info dict, one value per line."""
+    return "\n".join(info[key] for key in METADATA_SEARCH_KEYS if info.get(key))
+
+def read_pdf_metadata(caminho_pdf):
+    """
+    Reads the /Info metadata and the number of pages of a PDF without
+    reading its pages. Unlike get_metadata_pdf, errors are raised.
+
+    Retorna:
+    tuple: (metadados, número de páginas), com os metadados no formato de get_metadata_pdf
+    """
+    with open(caminho_pdf, 'rb') as arquivo:
+        leitor_pdf = PdfReader(arquivo, strict=False)
+        metadados = leitor_pdf.metadata or {}
+        regular_dict = {str(key): str(value) for key, value in metadados.items()}
+        # Lido do /Count da árvore de páginas, sem percorrê-la
+        return regular_dict, len(leitor_pdf.pages)
+
 # Exemplo de uso
 if __name__ == "__main__":
     pdf_path = "/mnt/boveda/DATASHEET/GDS-806810.pdf"
@@ -0,0 +1,125 @@
+import signal
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+class _Timeout(BaseException):
+    # BaseException, para não ser engolida pelos "except Exception" do PyPDF2
+    pass
+
+def _raise_timeout(signum, frame):
+    raise _Timeout()
+
+def init_pool_process(memory_limit_mb):
+    """Initializer of the pool processes: limits their address space."""
+    # Ctrl+C é tratado pelo processo principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+
+def new_pool(workers, memory_limit_mb=0):
+    """
+    Returns a ProcessPoolExecutor whose processes are limited to
+    memory_limit_mb MiB (0: no limit).
+
+    The processes are spawned (fresh interpreters), not forked: a fork of
+    the program would inherit the address space of Qt and of all its
+    threads, already close to the limit, and forking a multithreaded
+    process isn't safe anyway.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_pool_process, initargs=(memory_limit_mb,))
+
+def call_with_timeout(timeout, func, *args, **kwargs):
+    """
+    Calls func in a pool process, raising TimeoutError if it takes more
+    than timeout seconds (SIGALRM; no limit if 0 or not supported).
+    """
+    use_alarm = timeout and hasattr(signal, 'setitimer')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(*args, **kwargs)
+    except _Timeout:
+        raise TimeoutError(f"timeout ({timeout} s)") from None
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def _shutdown(pool, futures, wait):
+    # cancel_futures só existe a partir do Python 3.9
+    for future in futures:
+        future.cancel()
+    pool.shutdown(wait=wait)
+
+def bounded_map(make_pool, func, tasks, in_flight, canceled=lambda: False):
+    """
+    Runs func(*args) for each args of tasks in a process pool, keeping at
+    most in_flight tasks submitted, so a cancellation stops quickly and
+    a huge list of tasks doesn't become a huge list of futures.
+
+    If a process dies (e.g. killed by the memory limit), the pool breaks
+    and all the running tasks fail with it, without telling which one
+    killed the process. They are run again in a new pool, one at a time:
+    only a task that breaks the pool when running alone yields None.
+
+    Parameters:
+    - make_pool (callable): Returns a new ProcessPoolExecutor
+    - func (callable): Picklable function to call
+    - tasks (list): Tuples of arguments of func
+    - in_flight (int): Maximum number of submitted tasks
+    - canceled (callable, optional): Returns True to stop
+
+    Yields:
+    - tuple: (args, result), in completion order
+    """
+    pending = list(reversed(tasks))
+    suspects = []   # tarefas em execução quando um processo morreu
+    running = {}
+    alone = False   # a tarefa em execução é uma suspeita, sozinha no pool
+    pool = make_pool()
+    try:
+        while (pending or suspects or running) and not canceled():
+            if suspects:
+                if not running:
+                    args = suspects.pop()
+                    running[pool.submit(func, *args)] = args
+                    alone = True
+            else:
+                while pending and len(running) < in_flight:
+                    args = pending.pop()
+                    running[pool.submit(func, *args)] = args
+                    alone = False
+
+            done, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                args = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    if alone:
+                        yield args, None
+                    else:
+                        suspects.append(args)
+                    continue
+                yield args, result
+
+            if broken:
+                suspects.extend(running.values())
+                _shutdown(pool, running, wait=False)
+                running.clear()
+                pool = make_pool()
+    finally:
+        _shutdown(pool, running, wait=True)
@@ -1,13 +1,57 @@
 #!/usr/bin/python3
 
+import re
+
 from PyQt5.QtCore import QSortFilterProxyModel, Qt
 
+# Role com a chave de ordenação pré-calculada de uma célula
+SORT_KEY_ROLE = Qt.UserRole + 1
+
+DIGITS_RE = re.compile(r"(\d+)")
+
+def natural_sort_key(text):
+    """
+    Returns a case-insensitive key with natural numeric ordering,
+    so "vol2" sorts before "vol10".
+    """
+    parts = DIGITS_RE.split(text.casefold())
+    # As posições ímpares são sempre números, então os tipos nunca se misturam
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return tuple(parts)
+
 class CaseInsensitiveSortModel(QSortFilterProxyModel):
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Se o modelo de origem sabe se ordenar (SearchResultsModel), ele usa
+        # chaves e permutações em cache, sem chamar lessThan para cada comparação
+        source = self.sourceModel()
+        if source is not None and hasattr(source, 'sort_keys'):
+            source.sort(column, order)
+            return
+        super().sort(column, order)
+
+    def set_quick_filter(self, text):
+        """
+        Shows only the loaded rows containing text, without touching the disk.
+        SearchResultsModel filters itself with its precomputed lowercase keys.
+        """
+        source = self.sourceModel()
+        if source is not None and hasattr(source, 'set_filter'):
+            source.set_filter(text)
+            return
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setFilterKeyColumn(-1)
+        self.setFilterFixedString(text.strip())
+
     def lessThan(self, left, right):
+        left_key = left.data(SORT_KEY_ROLE)
+        right_key = right.data(SORT_KEY_ROLE)
+        if left_key is not None and right_key is not None:
+            return left_key < right_key
+
         # Comparação case-insensitive
         left_data = left.data(Qt.DisplayRole)
         right_data = right.data(Qt.DisplayRole)
 
         if isinstance(left_data, str) and isinstance(right_data, str):
-            return left_data.lower() < right_data.lower()
+            return natural_sort_key(left_data) < natural_sort_key(right_data)
         return left_data < right_data
@@ -0,0 +1,127 @@
+import re
+
+from alexandria_library.modules.bibtex import BIB_FIELDS
+
+# Tipo do arquivo reconhecido pelo conteúdo (filetypes.sniff_file_type), p. ex. type:pdf
+TYPE_FIELD = "type"
+
+# Campos aceitos na busca; "name" é o nome do arquivo
+QUERY_FIELDS = BIB_FIELDS + ("name", TYPE_FIELD)
+
+# Campos numéricos, que aceitam comparações e intervalos
+RANGE_FIELDS = ("year",)
+
+# Texto dos PDFs, buscado no índice de conteúdo (content_index.ContentIndex)
+CONTENT_FIELD = "content"
+
+TERM_RE = re.compile(r'(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+RANGE_RE = re.compile(r"^(>=|<=|>|<|=)?(\d+)$")
+INTERVAL_RE = re.compile(r"^(\d+)\.\.(\d+)$")
+
+class FieldTerm:
+    """
+    One field-scoped condition of a query.
+
+    Attributes:
+    - field (str): Field name (one of QUERY_FIELDS)
+    - value (str): Lowercase text that must be contained in the field
+    - low, high (int): Inclusive bounds for RANGE_FIELDS (None if open)
+    """
+    def __init__(self, field, value, low=None, high=None):
+        self.field = field
+        self.value = value
+        self.low = low
+        self.high = high
+
+    def is_range(self):
+        return self.low is not None or self.high is not None
+
+    def accepts_number(self, number):
+        if number is None:
+            return False
+        if self.low is not None and number < self.low:
+            return False
+        if self.high is not None and number > self.high:
+            return False
+        return True
+
+    def __repr__(self):
+        return f"FieldTerm({self.field!r}, {self.value!r}, {self.low!r}, {self.high!r})"
+
+def _range_term(field, value):
+    m = INTERVAL_RE.match(value)
+    if m:
+        return FieldTerm(field, value, int(m.group(1)), int(m.group(2)))
+    m = RANGE_RE.match(value)
+    if m is None:
+        return None
+    op, number = m.group(1) or "=", int(m.group(2))
+    if op == ">":
+        return FieldTerm(field, value, low=number + 1)
+    if op == ">=":
+        return FieldTerm(field, value, low=number)
+    if op == "<":
+        return FieldTerm(field, value, high=number - 1)
+    if op == "<=":
+        return FieldTerm(field, value, high=number)
+    return FieldTerm(field, value, number, number)
+
+def parse_query(text):
+    """
+    Parses the text of the search box.
+
+    Supported syntax:
+    - field:word or field:"some words", with field in QUERY_FIELDS
+    - year:2016, year:>=2010, year:<2000, year:2010..2015
+    - type:pdf, type:epub..., the type recognized from the content of the
+      file (not from its extension)
+    - content:word or content:"some words", searched in the text of the
+      PDFs (needs the optional content index)
+    - any other word (or "quoted words") is searched in the file name
+      and in the whole .bib text
+
+    Parameters:
+    text (str): Query text
+
+    Returns:
+    tuple: (free_terms, field_terms) where free_terms is a list of
+           lowercase strings and field_terms a list of FieldTerm.
+           If the query has no field term, free_terms holds the whole
+           query, so it keeps working as a plain substring search.
+    """
+    text = text.strip().lower()
+    free_terms = []
+    field_terms = []
+    for m in TERM_RE.finditer(text):
+        field, quoted, word = m.group(1), m.group(2), m.group(3)
+        value = quoted if quoted is not None else word
+        if (field in QUERY_FIELDS or field == CONTENT_FIELD) and value:
+            term = _range_term(field, value) if field in RANGE_FIELDS else None
+            field_terms.append(term or FieldTerm(field, value))
+        else:
+            term = value if field is None else m.group(0)
+            if term:
+                free_terms.append(term)
+
+    if not field_terms:
+        return ([text] if text else []), []
+    return free_terms, field_terms
+
+def has_content_terms(text):
+    """Returns True if the query has content: terms (see parse_query)."""
+    return any(term.field == CONTENT_FIELD for term in parse_query(text)[1])
+
+def refines(previous_text, text):
+    """
+    Returns True if every result of text is also a result of previous_text,
+    so text can be evaluated against the previous results only. This holds
+    for plain queries (no field terms) when the previous query is contained
+    in the new one, e.g. "knu" -> "knuth".
+    """
+    if not previous_text:
+        return False
+    previous_free, previous_fields = parse_query(previous_text)
+    free, fields = parse_query(text)
+    if previous_fields or fields:
+        return False
+    return previous_free[0] in free[0]
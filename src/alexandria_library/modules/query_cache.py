@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+def normalize_query(text):
+    """Lowercase text with single spaces, so equivalent queries share an entry."""
+    return " ".join(text.lower().split())
+
+class QueryCache:
+    """
+    In-memory LRU cache from (search root, normalized query) to results.
+
+    Each entry remembers the generation of the library (the sequence number
+    of the catalog, plus its content sequence for queries on the content)
+    in which it was computed; an entry of an older generation is never
+    returned, so a rescan, a saved .bib or a verified OCR invalidates all
+    the cached results, and new PDF text only the queries on the content.
+    """
+
+    def __init__(self, max_entries=32):
+        """
+        Parameters:
+        - max_entries (int): Maximum number of cached queries (0 disables the cache)
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, root_dir, text, generation):
+        """Returns the cached results, or None if missing or stale."""
+        key = (root_dir, normalize_query(text))
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != generation:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, root_dir, text, generation, results):
+        if self.max_entries <= 0:
+            return
+        key = (root_dir, normalize_query(text))
+        self.entries[key] = (generation, results)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
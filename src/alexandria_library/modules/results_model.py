@@ -0,0 +1,442 @@
+import os
+from array import array
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from alexandria_library.modules.proxy import SORT_KEY_ROLE, natural_sort_key
+
+# Bits da coluna de flags
+FLAG_BIB       = 0x01
+FLAG_OCR_KNOWN = 0x02
+FLAG_OCR_TRUE  = 0x04
+FLAG_REMOVED   = 0x80   # linha removida (p. ex. arquivo apagado), nunca mostrada
+
+def record_flags(has_bib, ocr):
+    """Returns the flags of a row from the sidecar state (ocr is True, False or None)."""
+    flags = FLAG_BIB if has_bib else 0
+    if ocr is not None:
+        flags |= FLAG_OCR_KNOWN
+        if ocr:
+            flags |= FLAG_OCR_TRUE
+    return flags
+
+YES_MARK = "✅"
+NO_MARK  = "❌"
+
+class SearchResultsModel(QAbstractTableModel):
+    """
+    Table model of the listed/found files with compact columnar storage.
+
+    Instead of one QStandardItem per cell, each row is stored as an index
+    into a list of interned directories, a file name and a byte of flags
+    (FLAG_BIB, FLAG_OCR_KNOWN, FLAG_OCR_TRUE). The cells are built lazily
+    in data(), only for the rows that the view shows.
+
+    Sorting is made by the model itself: the natural sort keys of each
+    column (see proxy.natural_sort_key) and the sorted permutation of the
+    rows are computed once per column and cached, and the rows are shown
+    through that permutation, so sorting never calls back into Python for
+    each comparison. The keys are also available with SORT_KEY_ROLE.
+
+    The quick filter of set_filter() works the same way: the lowercase
+    name, directory and .bib text of each row (the .bib text is taken from
+    bib_lookup, e.g. the in-memory search index) are computed once, and
+    the shown rows are the permutation restricted to the matching rows.
+
+    Rows can also be updated, added or removed by file path with
+    update_records() and remove_paths(), e.g. from the events of the
+    library watcher, without resetting the model. Removed rows are only
+    marked with FLAG_REMOVED, so the storage indexes never change.
+
+    The type of each file is not stored: it is taken from kind_lookup
+    (e.g. the in-memory search index, which holds the types cached in the
+    catalog) only for the shown cells and when sorting by type.
+
+    The rows can optionally carry a group number (e.g. the groups of
+    duplicated files), shown in an extra "Group" column.
+    """
+
+    HEADERS = ["Arquives", "Directories", "bib", "ocr", "Type"]
+    GROUP_HEADER = "Group"
+
+    COLUMN_NAME = 0
+    COLUMN_DIR  = 1
+    COLUMN_BIB  = 2
+    COLUMN_OCR  = 3
+    COLUMN_TYPE = 4
+    COLUMN_GROUP = 5
+
+    def __init__(self, base_path="", parent=None):
+        super().__init__(parent)
+        self.base_path = base_path
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self.filter_text = ""
+        self.bib_lookup = None      # file path -> lowercase .bib text
+        self.kind_lookup = None     # file path -> file type ("" if unknown)
+        self.headers = self.HEADERS
+        self._init_storage()
+
+    def _init_storage(self):
+        self.dirs = []          # directory id -> relative directory
+        self._dir_ids = {}      # relative directory -> directory id
+        self.dir_ids = array('I')
+        self.names = []
+        self.flags = bytearray()
+        self.groups = None          # storage index -> group number (-1: none), if grouped
+        self.order = array('I')     # row -> storage index
+        self._rows = None           # storage index -> row (-1 if hidden), built on demand
+        self._filter_keys = []      # storage index -> lowercase "name\ndir\nbib"
+        self._path_index = None     # absolute path -> storage index (built on demand)
+        self._removed = 0
+        self._invalidate_sort_cache()
+
+    def _invalidate_sort_cache(self):
+        self._sort_keys = {}        # column -> storage index -> key
+        self._permutations = {}     # column -> ascending list of storage indexes
+
+    def _intern_dir(self, directory):
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self.dirs)
+            self.dirs.append(directory)
+        return dir_id
+
+    def _store(self, records):
+        """Stores the records and returns the storage indexes of the new rows."""
+        prefix = os.path.join(self.base_path, '')
+        intern_dir = self._intern_dir
+        first = len(self.names)
+        for file_path, flags in records:
+            # os.path.relpath é lento demais para centenas de milhares de linhas
+            if file_path.startswith(prefix):
+                relative_path = file_path[len(prefix):]
+            else:
+                relative_path = os.path.relpath(file_path, self.base_path)
+            directory, _, name = relative_path.rpartition(os.sep)
+            self.dir_ids.append(intern_dir(directory))
+            self.names.append(name)
+            self.flags.append(flags)
+        if self.groups is not None:
+            # Linhas novas (p. ex. do watcher) ficam sem grupo
+            self.groups.extend([-1] * (len(self.names) - len(self.groups)))
+        if self._path_index is not None:
+            for i in range(first, len(self.names)):
+                self._path_index[self._storage_path(i)] = i
+        self._invalidate_sort_cache()
+        return range(first, len(self.names))
+
+    def _storage_path(self, i):
+        return os.path.join(self.base_path, self.dirs[self.dir_ids[i]], self.names[i])
+
+    def filter_keys(self):
+        """Returns (and caches) the lowercase filter keys, by storage index."""
+        keys = self._filter_keys
+        for i in range(len(keys), len(self.names)):
+            bib = self.bib_lookup(self._storage_path(i)) if self.bib_lookup else ""
+            keys.append(self.names[i].lower() + "\n" + self.dirs[self.dir_ids[i]].lower() + "\n" + bib)
+        return keys
+
+    def _kind(self, file_path):
+        return self.kind_lookup(file_path) if self.kind_lookup else ""
+
+    def path_index(self):
+        """Returns (and caches) the map from absolute path to storage index."""
+        if self._path_index is None:
+            flags = self.flags
+            self._path_index = {self._storage_path(i): i for i in range(len(self.names))
+                                if not flags[i] & FLAG_REMOVED}
+        return self._path_index
+
+    def _visible(self, indexes):
+        """Returns the storage indexes (in the given order) accepted by the filter."""
+        if self._removed:
+            flags = self.flags
+            indexes = [i for i in indexes if not flags[i] & FLAG_REMOVED]
+        if not self.filter_text:
+            return array('I', indexes)
+        keys = self.filter_keys()
+        words = self.filter_text.split()
+        if len(words) == 1:
+            word = words[0]
+            return array('I', [i for i in indexes if word in keys[i]])
+        return array('I', [i for i in indexes if all(word in keys[i] for word in words)])
+
+    def _base_order(self):
+        if self.sort_column >= 0:
+            return self._sorted_order(self.sort_column, self.sort_order)
+        return range(len(self.names))
+
+    def clear(self, base_path=None):
+        """Removes all rows and the sorting; base_path, if given, replaces the base path."""
+        self.beginResetModel()
+        if base_path is not None:
+            self.base_path = base_path
+        self.sort_column = -1
+        self.headers = self.HEADERS
+        self._init_storage()
+        self.endResetModel()
+
+    def set_records(self, records, base_path=None, groups=None):
+        """
+        Replaces all rows with a single model reset.
+
+        Parameters:
+        - records (list): Tuples (file_path, flags)
+        - base_path (str, optional): New base path of the relative directories
+        - groups (list, optional): Group number of each record; if given,
+          the "Group" column is shown
+        """
+        self.beginResetModel()
+        if base_path is not None:
+            self.base_path = base_path
+        self._init_storage()
+        if groups is not None:
+            self.groups = array('i', groups)
+            self.headers = self.HEADERS + [self.GROUP_HEADER]
+        else:
+            self.headers = self.HEADERS
+            if self.sort_column >= len(self.headers):
+                self.sort_column = -1
+        self._store(records)
+        self.order = self._visible(self._base_order())
+        self._rows = None
+        self.endResetModel()
+
+    def append_records(self, records):
+        """Appends rows (tuples (file_path, flags)) at the end of the model."""
+        if not records:
+            return
+        new_rows = self._visible(self._store(records))
+        if not new_rows:
+            return
+        first = len(self.order)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+        self.order.extend(new_rows)
+        self._rows = None
+        self.endInsertRows()
+
+    def _row_of(self, i):
+        """Returns the row showing the storage index i, or None if hidden."""
+        rows = self._rows
+        if rows is None or len(rows) < len(self.names):
+            rows = self._rows = array('i', [-1]) * len(self.names)
+            for row, j in enumerate(self.order):
+                rows[j] = row
+        row = rows[i]
+        return row if row >= 0 else None
+
+    def update_records(self, records, add_new=True):
+        """
+        Updates the flags of the rows of the given files in place, emitting
+        dataChanged only for the shown rows that changed.
+
+        Parameters:
+        - records (list): Tuples (file_path, flags)
+        - add_new (bool, optional): If True, the files not yet in the model
+          are appended (and the model sorted again); otherwise they are ignored
+        """
+        path_index = self.path_index()
+        new_records = []
+        changed = False
+        for file_path, flags in records:
+            i = path_index.get(file_path)
+            if i is None:
+                if add_new:
+                    new_records.append((file_path, flags))
+                continue
+            if i < len(self._filter_keys):
+                # O texto do .bib pode ter mudado
+                bib = self.bib_lookup(file_path) if self.bib_lookup else ""
+                self._filter_keys[i] = self.names[i].lower() + "\n" + self.dirs[self.dir_ids[i]].lower() + "\n" + bib
+            type_keys = self._sort_keys.get(self.COLUMN_TYPE)
+            if type_keys is not None:
+                # O arquivo pode ter mudado de tipo
+                kind = self._kind(file_path)
+                if type_keys[i] != kind:
+                    type_keys[i] = kind
+                    self._permutations.pop(self.COLUMN_TYPE, None)
+                    row = self._row_of(i)
+                    if row is not None:
+                        self.dataChanged.emit(self.index(row, self.COLUMN_TYPE), self.index(row, self.COLUMN_TYPE))
+            if self.flags[i] == flags:
+                continue
+            self.flags[i] = flags
+            changed = True
+            for column, keys in self._sort_keys.items():
+                if column == self.COLUMN_BIB:
+                    keys[i] = flags & FLAG_BIB
+                elif column == self.COLUMN_OCR:
+                    keys[i] = flags & (FLAG_OCR_KNOWN | FLAG_OCR_TRUE)
+            row = self._row_of(i)
+            if row is not None:
+                self.dataChanged.emit(self.index(row, self.COLUMN_BIB), self.index(row, self.COLUMN_OCR))
+        if changed:
+            # As chaves foram corrigidas no lugar; só as permutações são refeitas
+            self._permutations.pop(self.COLUMN_BIB, None)
+            self._permutations.pop(self.COLUMN_OCR, None)
+        if new_records:
+            self.append_records(new_records)
+            self.resort()
+
+    def update_record(self, file_path, flags):
+        """
+        Updates the flags of the row of one file, emitting dataChanged only
+        for its bib/ocr cells. Returns False if the file is not in the model.
+        """
+        if file_path not in self.path_index():
+            return False
+        self.update_records([(file_path, flags)], add_new=False)
+        return True
+
+    def remove_paths(self, paths):
+        """Removes the rows of the given files (unknown paths are ignored)."""
+        path_index = self.path_index()
+        rows = []
+        for file_path in paths:
+            i = path_index.pop(file_path, None)
+            if i is None:
+                continue
+            self.flags[i] |= FLAG_REMOVED
+            self._removed += 1
+            row = self._row_of(i)
+            if row is not None:
+                rows.append(row)
+        # De baixo para cima, para as linhas restantes não mudarem de número
+        for row in sorted(rows, reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.order[row]
+            self.endRemoveRows()
+        if rows:
+            self._rows = None
+
+    def set_filter(self, text):
+        """
+        Shows only the rows whose name, directory or .bib text contain all
+        the words of text (case-insensitive). An empty text shows all the rows.
+        """
+        text = text.strip().lower()
+        if text == self.filter_text:
+            return
+        self.beginResetModel()
+        self.filter_text = text
+        self.order = self._visible(self._base_order())
+        self._rows = None
+        self.endResetModel()
+
+    def total_count(self):
+        """Returns the number of rows, including the ones hidden by the filter."""
+        return len(self.names) - self._removed
+
+    def file_path(self, row):
+        """Returns the absolute path of the file of a row."""
+        return self._storage_path(self.order[row])
+
+    def file_info(self, row):
+        """
+        Returns (file_path, flags, kind) of a row from the stored state,
+        without touching the file (e.g. for the context menu).
+        """
+        i = self.order[row]
+        file_path = self._storage_path(i)
+        return file_path, self.flags[i], self._kind(file_path)
+
+    def sort_keys(self, column):
+        """Returns (and caches) the sort keys of a column, by storage index."""
+        keys = self._sort_keys.get(column)
+        if keys is None:
+            if column == self.COLUMN_NAME:
+                keys = [natural_sort_key(name) for name in self.names]
+            elif column == self.COLUMN_DIR:
+                dir_keys = [natural_sort_key(directory) for directory in self.dirs]
+                keys = [dir_keys[dir_id] for dir_id in self.dir_ids]
+            elif column == self.COLUMN_BIB:
+                keys = [flags & FLAG_BIB for flags in self.flags]
+            elif column == self.COLUMN_TYPE:
+                keys = [self._kind(self._storage_path(i)) for i in range(len(self.names))]
+            elif column == self.COLUMN_GROUP:
+                keys = list(self.groups)
+            else:
+                # Desconhecido < sem OCR < com OCR
+                keys = [flags & (FLAG_OCR_KNOWN | FLAG_OCR_TRUE) for flags in self.flags]
+            self._sort_keys[column] = keys
+        return keys
+
+    def _sorted_order(self, column, order):
+        permutation = self._permutations.get(column)
+        if permutation is None:
+            keys = self.sort_keys(column)
+            permutation = sorted(range(len(keys)), key=keys.__getitem__)
+            self._permutations[column] = permutation
+        if order == Qt.DescendingOrder:
+            return reversed(permutation)
+        return permutation
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sorts the rows by a column using the cached permutation of the column."""
+        self.sort_column = column
+        self.sort_order = order
+        if column < 0 or column >= len(self.headers):
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        old_order = self.order
+        self.order = self._visible(self._sorted_order(column, order))
+        self._rows = None
+
+        # Atualiza os índices persistentes (seleção, item atual)
+        new_rows = array('I', bytes(4 * len(self.names)))
+        for row, i in enumerate(self.order):
+            new_rows[i] = row
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(new_rows[old_order[index.row()]], index.column())
+                       for index in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def resort(self):
+        """Applies the last sort again, e.g. after appending rows."""
+        if self.sort_column >= 0:
+            self.sort(self.sort_column, self.sort_order)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.order[index.row()]
+        column = index.column()
+        if role == SORT_KEY_ROLE:
+            return self.sort_keys(column)[row]
+        if role != Qt.DisplayRole:
+            return None
+        if column == self.COLUMN_NAME:
+            return self.names[row]
+        if column == self.COLUMN_DIR:
+            return self.dirs[self.dir_ids[row]]
+        flags = self.flags[row]
+        if column == self.COLUMN_BIB:
+            return YES_MARK if flags & FLAG_BIB else NO_MARK
+        if column == self.COLUMN_OCR:
+            if not flags & FLAG_OCR_KNOWN:
+                return ""
+            return YES_MARK if flags & FLAG_OCR_TRUE else NO_MARK
+        if column == self.COLUMN_TYPE:
+            return self._kind(self._storage_path(row))
+        if column == self.COLUMN_GROUP:
+            group = self.groups[row]
+            return str(group + 1) if group >= 0 else ""
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
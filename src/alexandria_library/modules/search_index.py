@@ -0,0 +1,332 @@
+import os
+import re
+import bisect
+import threading
+
+from alexandria_library.modules.bibtex import parse_bibtex_fields
+from alexandria_library.modules.pdfs import parse_metadata_json, metadata_text
+from alexandria_library.modules.query import QUERY_FIELDS, CONTENT_FIELD, TYPE_FIELD, parse_query
+
+TOKEN_RE = re.compile(r"\w+")
+YEAR_RE = re.compile(r"\d{4}")
+
+def tokenize(text):
+    """Returns the set of lowercase word tokens of text."""
+    return set(TOKEN_RE.findall(text.lower()))
+
+class SearchIndex:
+    """
+    In-memory inverted index over the file names and the .bib sidecars
+    of the library, synchronized incrementally with a LibraryCatalog.
+
+    Each query token is looked up as a substring of the indexed tokens
+    (the vocabulary is much smaller than the documents), the candidate
+    sets are intersected and the candidates are then verified against
+    the indexed text, so the results are the same of a raw substring
+    search in the file name or in the .bib file.
+
+    The searchable PDF metadata (/Title, /Author, /Subject, /Keywords,
+    harvested into the catalog by metadata.MetadataHarvester) is indexed
+    as well, after the .bib text.
+
+    The parsed BibTeX fields (author, title, year, publisher, isbn) and
+    the file name are also stored column-wise, aligned with the doc ids,
+    for the field-scoped queries of query(); the author and title of the
+    PDF metadata are used when the .bib doesn't have them. The type of
+    the file, as cached in the catalog, is stored in the same way.
+
+    Terms on the content of the PDFs (content:...) are answered by
+    content_lookup, e.g. ContentIndex.lookup, which returns the set of
+    matching paths; without it they match nothing.
+
+    The index is shared between threads; all methods are protected by
+    a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.seq = 0
+        self.content_lookup = None     # text -> set of paths whose content contains it
+
+        self.doc_ids = {}      # path -> doc id
+        self.paths = []        # doc id -> path (None if removed)
+        self.texts = []        # doc id -> lowercase "name\nbib\nmetadata"
+        self.postings = {}     # token -> set of doc ids
+        self.columns = {field: [] for field in QUERY_FIELDS}  # field -> doc id -> lowercase value
+        self.years = []        # doc id -> int year (None if unknown)
+        self.sidecars = []     # doc id -> (has_bib, ocr) as stored in the catalog
+
+        self._vocabulary = None
+        self._free_ids = []
+
+    def sync(self, catalog):
+        """
+        Applies the changes made in the catalog since the last call.
+
+        Parameters:
+        - catalog (LibraryCatalog): Catalog opened by the calling thread
+
+        Returns:
+        - bool: True if the index changed
+        """
+        with self.lock:
+            rows, removed, last_seq = catalog.changes_since(self.seq)
+            if removed is None:
+                self.clear()
+            else:
+                for path in removed:
+                    self.remove(path)
+            for path, name, bib_text, has_bib, ocr, info, kind in rows:
+                self.update(path, name, bib_text or "", has_bib, ocr, parse_metadata_json(info), kind)
+            changed = bool(rows) or bool(removed)
+            self.seq = last_seq
+            return changed
+
+    def clear(self):
+        with self.lock:
+            self.doc_ids.clear()
+            self.paths = []
+            self.texts = []
+            self.postings.clear()
+            self.columns = {field: [] for field in QUERY_FIELDS}
+            self.years = []
+            self.sidecars = []
+            self._free_ids = []
+            self._vocabulary = None
+
+    def update(self, path, name, bib_text="", has_bib=0, ocr=None, metadata=None, kind=None):
+        """
+        Indexes (or indexes again) one file with the text of its .bib,
+        the state of its sidecars (ocr is 1, 0 or None if unknown), its
+        PDF metadata (a /Info dict as returned by pdfs.get_metadata_pdf)
+        and its type (see filetypes.sniff_file_type).
+        """
+        metadata = metadata or {}
+        with self.lock:
+            text = name.lower() + "\n" + bib_text.lower()
+            if metadata:
+                text += "\n" + metadata_text(metadata).lower()
+            doc_id = self.doc_ids.get(path)
+            if doc_id is not None:
+                self.sidecars[doc_id] = (has_bib, ocr)
+                self.columns[TYPE_FIELD][doc_id] = kind or None
+                if self.texts[doc_id] == text:
+                    return
+                self._unlink(doc_id)
+            elif self._free_ids:
+                doc_id = self._free_ids.pop()
+            else:
+                doc_id = len(self.paths)
+                self.paths.append(None)
+                self.texts.append(None)
+                self.years.append(None)
+                self.sidecars.append(None)
+                for column in self.columns.values():
+                    column.append(None)
+
+            self.doc_ids[path] = doc_id
+            self.paths[doc_id] = path
+            self.texts[doc_id] = text
+            self.sidecars[doc_id] = (has_bib, ocr)
+
+            fields = parse_bibtex_fields(bib_text) if bib_text else {}
+            fields["name"] = name
+            fields[TYPE_FIELD] = kind
+            for field, key in (("author", "/Author"), ("title", "/Title")):
+                if not fields.get(field) and metadata.get(key):
+                    fields[field] = metadata[key]
+            for field, column in self.columns.items():
+                value = fields.get(field)
+                column[doc_id] = value.lower() if value else None
+            year = YEAR_RE.search(fields.get("year", ""))
+            self.years[doc_id] = int(year.group(0)) if year else None
+            for token in tokenize(text):
+                docs = self.postings.get(token)
+                if docs is None:
+                    self.postings[token] = {doc_id}
+                    self._vocabulary = None
+                else:
+                    docs.add(doc_id)
+
+    def remove(self, path):
+        with self.lock:
+            doc_id = self.doc_ids.pop(path, None)
+            if doc_id is not None:
+                self._unlink(doc_id)
+                self.paths[doc_id] = None
+                self.texts[doc_id] = None
+                self.years[doc_id] = None
+                self.sidecars[doc_id] = None
+                for column in self.columns.values():
+                    column[doc_id] = None
+                self._free_ids.append(doc_id)
+
+    def _unlink(self, doc_id):
+        for token in tokenize(self.texts[doc_id]):
+            docs = self.postings.get(token)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self.postings[token]
+                    self._vocabulary = None
+
+    def sidecar_state(self, path):
+        """Returns (has_bib, ocr) of an indexed file, or (0, None) if unknown."""
+        with self.lock:
+            doc_id = self.doc_ids.get(path)
+            if doc_id is None:
+                return (0, None)
+            return self.sidecars[doc_id]
+
+    def file_kind(self, path):
+        """Returns the type of an indexed file ("" if unknown)."""
+        with self.lock:
+            doc_id = self.doc_ids.get(path)
+            if doc_id is None:
+                return ""
+            return self.columns[TYPE_FIELD][doc_id] or ""
+
+    def bib_text(self, path):
+        """
+        Returns the lowercase .bib text, followed by the searchable PDF
+        metadata, of an indexed file ("" if unknown).
+        """
+        with self.lock:
+            doc_id = self.doc_ids.get(path)
+            if doc_id is None:
+                return ""
+            return self.texts[doc_id].partition("\n")[2]
+
+    def vocabulary(self):
+        """Returns the sorted list of indexed tokens."""
+        with self.lock:
+            if self._vocabulary is None:
+                self._vocabulary = sorted(self.postings)
+            return self._vocabulary
+
+    def prefix_lookup(self, prefix):
+        """Returns the doc ids with a token starting with prefix."""
+        with self.lock:
+            vocabulary = self.vocabulary()
+            docs = set()
+            i = bisect.bisect_left(vocabulary, prefix)
+            while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+                docs.update(self.postings[vocabulary[i]])
+                i += 1
+            return docs
+
+    def substring_lookup(self, fragment):
+        """Returns the doc ids with a token containing fragment."""
+        with self.lock:
+            docs = set()
+            for token in self.vocabulary():
+                if fragment in token:
+                    docs.update(self.postings[token])
+            return docs
+
+    def _free_term_candidates(self, term):
+        tokens = TOKEN_RE.findall(term)
+        if not tokens:
+            return set(self.doc_ids.values())
+        # O token mais longo costuma ser o mais seletivo
+        tokens.sort(key=len, reverse=True)
+        candidates = self.substring_lookup(tokens[0])
+        for token in tokens[1:]:
+            if not candidates:
+                break
+            candidates &= self.substring_lookup(token)
+        return candidates
+
+    def _field_term_matches(self, term, doc_id):
+        if term.is_range():
+            return term.accepts_number(self.years[doc_id])
+        value = self.columns[term.field][doc_id]
+        return value is not None and term.value in value
+
+    def query(self, text, root_dir=None, candidates=None):
+        """
+        Returns the paths of the files matching a query of the search box
+        (see parse_query): free terms are searched in the file name and in
+        the whole .bib text, field terms only in their parsed fields.
+
+        Parameters:
+        - text (str): Query text
+        - root_dir (str, optional): Only return files under this directory
+        - candidates (list, optional): Only evaluate these file paths (e.g.
+          the results of a query contained in text), skipping the lookups
+
+        Returns:
+        - list: Sorted list of matching file paths
+        """
+        free_terms, field_terms = parse_query(text)
+        content_terms = [t for t in field_terms if t.field == CONTENT_FIELD]
+        field_terms = [t for t in field_terms if t.field != CONTENT_FIELD]
+        # O índice de conteúdo tem a sua própria base, consultada fora do lock
+        content_paths = self._content_paths(content_terms) if content_terms else None
+
+        with self.lock:
+            if candidates is not None or content_paths is not None:
+                doc_ids = self.doc_ids
+                paths = content_paths if candidates is None else \
+                        [path for path in candidates if content_paths is None or path in content_paths]
+                docs = [doc_ids[path] for path in paths if path in doc_ids]
+                if candidates is None and (free_terms or field_terms):
+                    docs = self._term_candidates(free_terms, field_terms).intersection(docs)
+                return self._verify(docs, free_terms, field_terms, root_dir)
+
+            return self._verify(self._term_candidates(free_terms, field_terms),
+                                free_terms, field_terms, root_dir)
+
+    def _content_paths(self, content_terms):
+        if self.content_lookup is None:
+            return set()
+        paths = None
+        for term in content_terms:
+            found = self.content_lookup(term.value)
+            paths = found if paths is None else paths & found
+        return paths
+
+    def _term_candidates(self, free_terms, field_terms):
+        """Returns the doc ids that may match the terms, to be verified."""
+        with self.lock:
+            # Os valores dos campos também estão no texto indexado (exceto o
+            # tipo), então servem para reduzir os candidatos antes de olhar as colunas
+            candidates = None
+            for term in free_terms + [t.value for t in field_terms
+                                      if not t.is_range() and t.field != TYPE_FIELD]:
+                docs = self._free_term_candidates(term)
+                candidates = docs if candidates is None else candidates & docs
+            ranges = [t for t in field_terms if t.is_range()]
+            if candidates is None and not ranges:
+                candidates = set(self.doc_ids.values())
+            elif candidates is None:
+                candidates = {doc_id for doc_id, year in enumerate(self.years)
+                              if year is not None and ranges[0].accepts_number(year)}
+            return candidates
+
+    def _verify(self, candidates, free_terms, field_terms, root_dir):
+        with self.lock:
+            prefix = os.path.join(os.path.normpath(root_dir), '') if root_dir else None
+            results = []
+            for doc_id in candidates:
+                path = self.paths[doc_id]
+                if prefix is not None and not path.startswith(prefix):
+                    continue
+                text = self.texts[doc_id]
+                if all(term in text for term in free_terms) and \
+                   all(self._field_term_matches(term, doc_id) for term in field_terms):
+                    results.append(path)
+            results.sort()
+            return results
+
+# Índices compartilhados, um por catálogo
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_search_index(catalog_path):
+    """Returns the SearchIndex shared by all the threads for a catalog file."""
+    with _indexes_lock:
+        index = _indexes.get(catalog_path)
+        if index is None:
+            index = _indexes[catalog_path] = SearchIndex()
+        return index
@@ -1,55 +1,34 @@
 import os
-import json
 from PyQt5.QtWidgets import QHeaderView
-from PyQt5.QtGui import QStandardItem
 
 from alexandria_library.modules.proxy import CaseInsensitiveSortModel
+from alexandria_library.modules.results_model import record_flags
+from alexandria_library.modules.sidecar_store import get_sidecar_store, read_ocr_value
 
-def display_search_results_from_file_list(parent, base_path, file_list):
+def file_flags(file_path):
+    """Returns the flags of SearchResultsModel for the sidecars of a file."""
+    store = get_sidecar_store(file_path)
+    if store is not None:
+        bib, _, ocr, _ = store.entry(file_path)
+        return record_flags(bib is not None, None if ocr is None else bool(ocr))
+    return record_flags(os.path.exists(file_path+'.bib'), read_ocr_value(file_path))
 
-    
+def clear_search_results(parent, base_path):
     # Clear the model
-    parent.all_files_model.clear()
-    
-    parent.all_files_model.setHorizontalHeaderLabels(["Arquives","Directories","bib","ocr"])
-    
-    parent.progress_bar.setValue(0)
-    L = len(file_list)
-
-    for l,file_path in enumerate(file_list):
-        relative_path = os.path.relpath(file_path, base_path)
-        filename  = os.path.basename(relative_path)
-        directory = os.path.dirname(relative_path)
-        
-        item1 = QStandardItem(filename)
-        item2 = QStandardItem(directory)
-        
-        if os.path.exists(file_path+'.bib'):
-            item3 = QStandardItem("✅")
-        else:
-            item3 = QStandardItem("❌")
-            
-        item4 = QStandardItem("")
-        if os.path.exists(file_path+'.json'):
-            with open(file_path+'.json', 'r', encoding='utf-8') as f:
-                dados = json.load(f)
-                ocr = dados.get("ocr",None)
-                if ocr==True:
-                    item4 = QStandardItem("✅")
-                elif ocr==False:
-                    item4 = QStandardItem("❌")
-            
-        
-        parent.all_files_model.appendRow([item1,item2,item3,item4])
-        
-        parent.progress_bar.setValue(int(((l+1)*100.0)/L))
+    parent.all_files_model.clear(base_path)
+
+def append_search_results_from_records(parent, records):
+    """Appends (file_path, flags) records already populated by the worker; no filesystem I/O."""
+    parent.all_files_model.append_records(records)
+
+def finish_search_results(parent, number_of_files):
     parent.progress_bar.setValue(0)
-    
+
     # Configurar a view para mostrar as colunas
     parent.proxy_model = CaseInsensitiveSortModel()
     parent.proxy_model.setSourceModel(parent.all_files_model)
     parent.table_view.setModel(parent.proxy_model)
-    
+
     # Configurações de redimensionamento de colunas
     header = parent.table_view.horizontalHeader()
     header.setEnabled(True)
@@ -57,14 +36,32 @@ def display_search_results_from_file_list(parent, base_path, file_list):
 
     # Configuração global POR ÚLTIMO
     header.setSectionResizeMode(QHeaderView.Interactive)
-            
+
     # Opcional: Habilitar movimentação de colunas
     header.setSectionsMovable(True)
-    
+
     # Definir largura inicial da segunda coluna
     header.resizeSection(0, 500)  # Largura inicial de 150 pixels
-    header.resizeSection(1, 150)  
-    header.resizeSection(2, 30)  
-    header.resizeSection(3, 30)  
-            
-    parent.statusBar().showMessage(f"{len(file_list)} files found")
+    header.resizeSection(1, 150)
+    header.resizeSection(2, 30)
+    header.resizeSection(3, 30)
+    header.resizeSection(4, 50)
+
+    # As linhas recebidas em blocos chegam fora de ordem
+    parent.all_files_model.resort()
+
+    model = parent.all_files_model
+    if model.rowCount() != model.total_count():
+        parent.statusBar().showMessage(f"{number_of_files} files found ({model.rowCount()} shown)")
+    else:
+        parent.statusBar().showMessage(f"{number_of_files} files found")
+
+def display_search_results_from_file_list(parent, base_path, file_list):
+
+    parent.progress_bar.setValue(0)
+
+    # Uma única atualização do modelo para toda a lista
+    records = [(file_path, file_flags(file_path)) for file_path in file_list]
+    parent.all_files_model.set_records(records, base_path)
+
+    finish_search_results(parent, len(file_list))
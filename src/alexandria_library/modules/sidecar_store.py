@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+# Arquivo único de metadados, na raiz da biblioteca (oculto, ignorado pelo catálogo)
+STORE_NAME = ".alexandria_sidecars.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path      TEXT PRIMARY KEY,
+    dir       TEXT NOT NULL,
+    bib       TEXT,
+    bib_mtime REAL,
+    ocr       INTEGER,
+    ocr_mtime REAL
+);
+CREATE INDEX IF NOT EXISTS entries_dir ON entries(dir);
+"""
+
+def is_store_file(filename):
+    """Returns True for the store file itself and its -wal/-shm companions."""
+    return filename.startswith(STORE_NAME)
+
+class SidecarStore:
+    """
+    Consolidated store of the sidecar data of a library, in one SQLite
+    file at its root: the .bib text and the "ocr" value of each library
+    file, keyed by the path relative to the root (so the library can be
+    moved), with the time of the last change of each one.
+
+    It replaces the <file>.bib and <file>.json sidecars when enabled (see
+    set_store_root): the catalog reads a whole directory with one query
+    instead of opening two files per document. The sidecars remain the
+    exchange format, see import_sidecars and export_sidecars.
+
+    Each thread gets its own connection, so the same instance can be used
+    by all the workers.
+    """
+
+    def __init__(self, root_dir):
+        """
+        Parameters:
+        - root_dir (str): Library directory; the store is root_dir/STORE_NAME
+        """
+        self.root_dir = os.path.normpath(root_dir)
+        self.db_path = os.path.join(self.root_dir, STORE_NAME)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Closes the connection of the calling thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def commit(self):
+        self._connection().commit()
+
+    def _relative(self, path):
+        return os.path.relpath(os.path.normpath(path), self.root_dir)
+
+    def contains(self, path):
+        """Returns True if path is inside the library of the store."""
+        path = os.path.normpath(path)
+        return path == self.root_dir or path.startswith(os.path.join(self.root_dir, ''))
+
+    def entry(self, file_path):
+        """Returns (bib, bib_mtime, ocr, ocr_mtime) of a file; None values if unknown."""
+        row = self._connection().execute(
+                    "SELECT bib, bib_mtime, ocr, ocr_mtime FROM entries WHERE path = ?",
+                    (self._relative(file_path),)).fetchone()
+        return row if row is not None else (None, None, None, None)
+
+    def directory_entries(self, dir_path):
+        """Returns {name: (bib, bib_mtime, ocr, ocr_mtime)} of the files of one directory."""
+        rel_dir = self._relative(dir_path)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        return {os.path.basename(r[0]): r[1:] for r in self._connection().execute(
+                    "SELECT path, bib, bib_mtime, ocr, ocr_mtime FROM entries WHERE dir = ?", (rel_dir,))}
+
+    def _upsert(self, file_path, column, value, mtime, commit):
+        rel_path = self._relative(file_path)
+        conn = self._connection()
+        conn.execute("INSERT OR IGNORE INTO entries (path, dir) VALUES (?, ?)",
+                     (rel_path, os.path.dirname(rel_path)))
+        conn.execute(f"UPDATE entries SET {column} = ?, {column}_mtime = ? WHERE path = ?",
+                     (value, mtime if value is not None else None, rel_path))
+        conn.execute("DELETE FROM entries WHERE path = ? AND bib IS NULL AND ocr IS NULL", (rel_path,))
+        if commit:
+            conn.commit()
+
+    def set_bib(self, file_path, text, mtime=None, commit=True):
+        """Stores the .bib text of a file (None removes it)."""
+        self._upsert(file_path, "bib", text, mtime or time.time(), commit)
+
+    def set_ocr(self, file_path, ocr, mtime=None, commit=True):
+        """Stores the "ocr" value (True/False, None removes it) of a file."""
+        value = None if ocr is None else int(bool(ocr))
+        self._upsert(file_path, "ocr", value, mtime or time.time(), commit)
+
+    def iter_entries(self):
+        """Yields (file_path, bib, ocr) of all the entries."""
+        for rel_path, bib, ocr in self._connection().execute("SELECT path, bib, ocr FROM entries ORDER BY path"):
+            yield os.path.join(self.root_dir, rel_path), bib, ocr
+
+# Store em uso (None: sidecars em arquivos)
+_store = None
+_store_lock = threading.Lock()
+
+def set_store_root(root_dir):
+    """
+    Enables the consolidated store of the library at root_dir for the
+    whole program (None disables it, going back to the sidecar files).
+    """
+    global _store
+    with _store_lock:
+        _store = SidecarStore(root_dir) if root_dir else None
+
+def get_sidecar_store(path):
+    """Returns the enabled SidecarStore if path is inside its library, otherwise None."""
+    store = _store
+    if store is not None and store.contains(path):
+        return store
+    return None
+
+def _read_json(json_path):
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else dict()
+    except (OSError, ValueError):
+        return dict()
+
+def _write_json_ocr(file_path, ocr):
+    # Mantém as outras chaves do .json
+    data = _read_json(file_path + '.json')
+    data["ocr"] = ocr
+    with open(file_path + '.json', 'w', encoding='utf-8') as arquivo:
+        json.dump(data, arquivo, indent=4, ensure_ascii=False)
+
+def read_bib(file_path):
+    """Returns the .bib text of a library file, or None if it has none."""
+    store = get_sidecar_store(file_path)
+    if store is not None:
+        return store.entry(file_path)[0]
+    try:
+        with open(file_path + '.bib', 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def write_bib(file_path, text):
+    """Saves the .bib text of a library file, in the store or in its .bib sidecar."""
+    store = get_sidecar_store(file_path)
+    if store is not None:
+        store.set_bib(file_path, text)
+        return
+    with open(file_path + '.bib', 'w', encoding='utf-8') as arquivo:
+        arquivo.write(text)
+
+def read_ocr_value(file_path):
+    """Returns the "ocr" value (True, False or None if unknown) of a library file."""
+    store = get_sidecar_store(file_path)
+    if store is not None:
+        ocr = store.entry(file_path)[2]
+    else:
+        ocr = _read_json(file_path + '.json').get("ocr", None)
+    if ocr is None:
+        return None
+    return bool(ocr)
+
+def write_ocr(file_path, ocr, commit=True):
+    """
+    Saves the "ocr" value of a library file, in the store or in its .json
+    sidecar. With commit=False a write to the store waits for
+    commit_sidecars (e.g. to write a batch in one transaction).
+    """
+    store = get_sidecar_store(file_path)
+    if store is not None:
+        store.set_ocr(file_path, ocr, commit=commit)
+        return
+    _write_json_ocr(file_path, ocr)
+
+def commit_sidecars():
+    """Commits the pending writes of the calling thread to the store, if enabled."""
+    store = _store
+    if store is not None:
+        store.commit()
+
+def import_sidecars(root_dir, remove=False):
+    """
+    Copies the .bib/.json sidecars of a library into its store (creating
+    it), keeping their mtimes. With remove=True the sidecars are deleted
+    after the copy is committed, except the .json ones with keys other
+    than "ocr" (the store keeps only that one), which are kept and listed.
+
+    Returns:
+    - int: Number of sidecars imported
+    """
+    store = SidecarStore(root_dir)
+    imported = []
+    kept = []
+    try:
+        for dir_path, dirnames, filenames in os.walk(store.root_dir):
+            names = set(filenames)
+            for name in filenames:
+                base, ext = os.path.splitext(name)
+                if ext not in ('.bib', '.json') or base not in names:
+                    continue
+                sidecar = os.path.join(dir_path, name)
+                file_path = os.path.join(dir_path, base)
+                try:
+                    mtime = os.stat(sidecar).st_mtime
+                    if ext == '.bib':
+                        with open(sidecar, 'r', encoding='utf-8') as f:
+                            store.set_bib(file_path, f.read(), mtime, commit=False)
+                    else:
+                        data = _read_json(sidecar)
+                        store.set_ocr(file_path, data.get("ocr", None), mtime, commit=False)
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"Erro ao importar {sidecar}: {e}")
+                    continue
+                if ext == '.json' and set(data) - {"ocr"}:
+                    # As outras chaves só existem no .json
+                    kept.append(sidecar)
+                else:
+                    imported.append(sidecar)
+        store.commit()
+    finally:
+        store.close()
+    if remove:
+        for sidecar in imported:
+            try:
+                os.remove(sidecar)
+            except OSError as e:
+                print(f"Erro ao remover {sidecar}: {e}")
+        for sidecar in kept:
+            print(f"Mantido (tem outras chaves além de \"ocr\"): {sidecar}")
+    return len(imported) + len(kept)
+
+def export_sidecars(root_dir):
+    """
+    Writes the entries of the store of a library back as .bib/.json
+    sidecars (the other keys of existing .json files are kept).
+
+    Returns:
+    - int: Number of sidecars written
+    """
+    store = SidecarStore(root_dir)
+    written = 0
+    try:
+        for file_path, bib, ocr in store.iter_entries():
+            if not os.path.exists(file_path):
+                continue
+            try:
+                if bib is not None:
+                    with open(file_path + '.bib', 'w', encoding='utf-8') as arquivo:
+                        arquivo.write(bib)
+                    written += 1
+                if ocr is not None:
+                    _write_json_ocr(file_path, bool(ocr))
+                    written += 1
+            except OSError as e:
+                print(f"Erro ao exportar os sidecars de {file_path}: {e}")
+    finally:
+        store.close()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Moves the .bib/.json sidecars of a library into its consolidated store, or back.")
+    parser.add_argument("direction", choices=["import", "export"],
+                        help="import: sidecars -> store; export: store -> sidecars")
+    parser.add_argument("library", help="Library directory")
+    parser.add_argument("--remove", action="store_true",
+                        help="With import, delete the sidecars after copying them "
+                             "(.json files with keys other than \"ocr\" are kept)")
+    args = parser.parse_args()
+    library = os.path.expanduser(args.library)
+    if args.direction == "import":
+        print(f"{import_sidecars(library, remove=args.remove)} sidecars imported into {os.path.join(library, STORE_NAME)}")
+    else:
+        print(f"{export_sidecars(library)} sidecars exported")
+
+if __name__ == "__main__":
+    main()
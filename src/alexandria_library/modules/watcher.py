@@ -0,0 +1,265 @@
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import sqlite3
+import ctypes
+import ctypes.util
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from alexandria_library.modules.catalog import LibraryCatalog
+from alexandria_library.modules.results_model import record_flags
+from alexandria_library.modules.search_index import get_search_index
+from alexandria_library.modules.sidecar_store import is_store_file
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_ISDIR       = 0x40000000
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+def _load_libc():
+    """Returns the libc with inotify, or None if it isn't available (not Linux)."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class Inotify:
+    """Minimal ctypes wrapper of the Linux inotify API."""
+
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}      # watch descriptor -> directory
+
+    def add_watch(self, dir_path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            # O diretório pode ter sido removido entre a listagem e a inscrição
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return None
+            raise OSError(err, os.strerror(err), dir_path)
+        self.dirs[wd] = dir_path
+        return wd
+
+    def read_events(self, timeout):
+        """
+        Waits up to timeout seconds and returns the pending events as
+        tuples (directory, name, mask); the directory is None if unknown.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            events.append((self.dirs.get(wd), name, mask))
+            if mask & IN_MOVE_SELF:
+                # O caminho guardado deixou de valer; o novo lugar é observado pelo pai
+                self.libc.inotify_rm_watch(self.fd, wd)
+                self.dirs.pop(wd, None)
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class LibraryWatcher(QThread):
+    """
+    Background watcher of the library directory that keeps the catalog,
+    the in-memory search index and the open table up to date.
+
+    On Linux, one inotify watch is added for each directory known to the
+    catalog (the directories are never walked again); the events are
+    coalesced for EVENT_DELAY seconds and only the directories where
+    something was created, removed or renamed are listed again, with
+    LibraryCatalog.rescan(force=True) for files written in place. A .bib
+    or .json written in place updates only its file. Where inotify is
+    not available (other systems, too many watches, queue overflow) the
+    watcher falls back to an incremental rescan every POLL_INTERVAL
+    seconds.
+
+    The changes are taken from the catalog with changes_since(), applied
+    to the shared SearchIndex and emitted with files_changed.
+
+    Signals:
+    - files_changed: Emits (records, removed), where records are the
+      (file_path, flags) of the created or modified files, with the flags
+      of results_model, and removed are the paths of the removed files
+    - library_scanned: Emitted once the initial rescan of the library is
+      done, e.g. to start the jobs that read the catalog without
+      rescanning it again
+    """
+
+    EVENT_DELAY = 0.2
+    POLL_INTERVAL = 5.0
+
+    files_changed = pyqtSignal(list, list)
+    library_scanned = pyqtSignal()
+
+    def __init__(self, root_dir, catalog_path, use_inotify=True):
+        """
+        Parameters:
+        - root_dir (str): Library directory to watch
+        - catalog_path (str): Path of the SQLite catalog
+        - use_inotify (bool, optional): If False, always uses polling
+        """
+        super().__init__()
+        self.root_dir = os.path.normpath(root_dir)
+        self.catalog_path = catalog_path
+        self.use_inotify = use_inotify
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def run(self):
+        catalog = LibraryCatalog(self.catalog_path)
+        self.index = get_search_index(self.catalog_path)
+        try:
+            self.seq = catalog.sequence()
+            try:
+                catalog.rescan(self.root_dir, canceled=lambda: self.canceled)
+                self._publish(catalog)
+            except sqlite3.OperationalError as e:
+                # Os próximos varrimentos tentam de novo
+                print(f"Erro ao atualizar o catálogo: {e}")
+            if not self.canceled:
+                self.library_scanned.emit()
+
+            libc = _load_libc() if self.use_inotify else None
+            if libc is not None:
+                try:
+                    self._watch(catalog, Inotify(libc))
+                except OSError as e:
+                    print(f"inotify unavailable, falling back to polling: {e}")
+            self._poll(catalog)
+        finally:
+            catalog.close()
+
+    def _publish(self, catalog):
+        """Applies the catalog changes to the search index and emits them."""
+        self.index.sync(catalog)
+        rows, removed, self.seq = catalog.changes_since(self.seq)
+        if rows or removed:
+            records = [(path, record_flags(has_bib, ocr)) for path, _, _, has_bib, ocr, _, _ in rows]
+            self.files_changed.emit(records, removed or [])
+
+    def _poll(self, catalog):
+        while not self.canceled:
+            deadline = time.monotonic() + self.POLL_INTERVAL
+            while not self.canceled and time.monotonic() < deadline:
+                time.sleep(0.1)
+            if self.canceled:
+                break
+            try:
+                catalog.rescan(self.root_dir, canceled=lambda: self.canceled, check_sidecars=True)
+                self._publish(catalog)
+            except sqlite3.OperationalError as e:
+                print(f"Erro ao atualizar o catálogo: {e}")
+
+    def _add_tree(self, inotify, dir_paths):
+        for dir_path in dir_paths:
+            inotify.add_watch(dir_path)
+
+    def _watch(self, catalog, inotify):
+        try:
+            self._add_tree(inotify, catalog.list_directories(self.root_dir))
+            root_prefix = os.path.join(self.root_dir, '')
+
+            dirty = set()        # diretórios a listar de novo
+            written = set()      # diretórios com arquivos escritos no lugar
+            sidecars = set()     # .bib/.json escritos no lugar
+            first_event = None
+            while not self.canceled:
+                for dir_path, name, mask in inotify.read_events(0.1):
+                    if mask & IN_Q_OVERFLOW:
+                        # Eventos perdidos: volta ao varrimento periódico
+                        return
+                    if dir_path is None or is_store_file(name):
+                        # O arquivo único de metadados é atualizado pelo próprio programa
+                        continue
+                    if first_event is None:
+                        first_event = time.monotonic()
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                        dirty.add(os.path.dirname(dir_path))
+                    elif mask & (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO):
+                        dirty.add(dir_path)
+                    elif name.endswith('.bib') or name.endswith('.json'):
+                        sidecars.add(os.path.join(dir_path, name))
+                    else:
+                        written.add(dir_path)
+
+                if first_event is None or time.monotonic() - first_event < self.EVENT_DELAY:
+                    continue
+                first_event = None
+
+                try:
+                    for dir_path in dirty | written:
+                        if self.canceled:
+                            break
+                        if dir_path != self.root_dir and not dir_path.startswith(root_prefix):
+                            continue
+                        known = set(catalog.list_directories(dir_path))
+                        catalog.rescan(dir_path, canceled=lambda: self.canceled,
+                                       force=dir_path in written)
+                        # Novos subdiretórios (criados ou movidos para dentro) passam a ser observados
+                        self._add_tree(inotify, set(catalog.list_directories(dir_path)) - known)
+                    for sidecar in sidecars:
+                        path, ext = os.path.splitext(sidecar)
+                        if os.path.dirname(sidecar) in dirty:
+                            continue
+                        if ext == '.bib':
+                            catalog.update_bib(path)
+                        else:
+                            catalog.update_ocr(path)
+                except sqlite3.OperationalError as e:
+                    # Mantém os eventos pendentes e tenta de novo depois de EVENT_DELAY
+                    print(f"Erro ao atualizar o catálogo: {e}")
+                    first_event = time.monotonic()
+                    continue
+                dirty.clear()
+                written.clear()
+                sidecars.clear()
+                self._publish(catalog)
+        finally:
+            inotify.close()
@@ -1,6 +1,12 @@
 import os
+import time
+import sqlite3
 from PyQt5.QtCore import QThread, pyqtSignal
 
+from alexandria_library.modules.catalog import LibraryCatalog, read_ocr
+from alexandria_library.modules.results_model import record_flags
+from alexandria_library.modules.search_index import get_search_index
+
 class FileWorker(QThread):
     """
     A QThread-based worker class for searching and listing files in a directory.
@@ -9,8 +15,19 @@ class FileWorker(QThread):
     - progress_updated: Emits the current progress percentage of file processing
     - search_complete: Emits a list of files matching the search criteria
     - directory_files_found: Emits a list of all files found in the directory
+    - files_batch_found: Emits chunks of (file_path, flags) records of found 
+      files, with the sidecar flags of results_model (streaming mode)
+    - scan_finished: Emits the total number of found files (streaming mode)
     """
     
+    # Streaming mode: maximum number of files and maximum time (s) per batch
+    BATCH_SIZE = 500
+    BATCH_INTERVAL = 0.05
+    
+    # Number of files found in the last complete scan of each root directory,
+    # used to estimate the progress without counting the files beforehand
+    last_totals = {}
+    
     # Signal to update progress during file processing
     progress_updated = pyqtSignal(int)
     
@@ -19,8 +36,15 @@ class FileWorker(QThread):
     
     # Signal to indicate all files in directory have been found
     directory_files_found = pyqtSignal(list)
+    
+    # Signal to deliver the found files in chunks of (file_path, flags) records (streaming mode)
+    files_batch_found = pyqtSignal(list)
+    
+    # Signal to indicate the end of a streaming scan with the number of found files
+    scan_finished = pyqtSignal(int)
 
-    def __init__(self, root_dir, search_text=None, list_all=False):
+    def __init__(self, root_dir, search_text=None, list_all=False, catalog_path=None, streaming=False, 
+                 check_sidecars=False, candidates=None, check_files=False):
         """
         Initialize the FileWorker thread.
         
@@ -30,28 +54,71 @@ class FileWorker(QThread):
           Defaults to None.
         - list_all (bool, optional): If True, lists all files instead of searching. 
           Defaults to False.
+        - catalog_path (str, optional): Path of the SQLite catalog. If given, 
+          list_all reads the files from the catalog after an incremental 
+          rescan instead of walking the whole subtree, and searches are 
+          answered by the inverted index of the catalog. Defaults to None.
+        - streaming (bool, optional): If True, walks the subtree only once with 
+          os.scandir and delivers the files in chunks through files_batch_found, 
+          followed by scan_finished. The records already carry the bib/ocr 
+          state, so the display does no filesystem I/O. Defaults to False.
+        - check_sidecars (bool, optional): If True, the catalog rescan also 
+          stats the .bib sidecars of unchanged directories. Defaults to False.
+        - candidates (list, optional): File paths found by a previous search 
+          whose query is contained in search_text. If given, only these files 
+          are evaluated, instead of the whole subtree. Defaults to None.
+        - check_files (bool, optional): If True, the catalog rescan also 
+          stats the files of unchanged directories, to detect files rewritten 
+          in place. Defaults to False.
         
         Attributes:
         - root_dir: Stores the root directory path
         - search_text: Lowercase search text (None if not searching)
         - list_all: Flag to determine if listing all files or searching
+        - catalog_path: Path of the SQLite catalog (None to walk the disk)
+        - streaming: Flag to deliver the files in chunks
+        - check_sidecars: Flag to detect .bib sidecars edited in place
+        - candidates: Previous results to refine (None to search the subtree)
+        - check_files: Flag to detect files rewritten in place
         - canceled: Flag to allow cancellation of file processing
         """
         super().__init__()
         self.root_dir = root_dir
         self.search_text = search_text.lower() if search_text else None
         self.list_all = list_all
+        self.catalog_path = catalog_path
+        self.streaming = streaming
+        self.check_sidecars = check_sidecars
+        self.candidates = candidates
+        self.check_files = check_files
         self.canceled = False
+        
+        self._batch = []
+        self._batch_time = 0.0
+        self._found = 0
+        self._progress = -1
 
     def run(self):
         """
         Main thread method. Determines whether to list all files or search files 
         based on initialization parameters.
         
-        If list_all is True, calls list_all_files()
-        If search_text is provided, calls search_files()
+        If list_all is True, calls list_all_files() (or list_catalog_files() 
+        when a catalog is configured)
+        If search_text is provided, calls search_files() (or search_index_files() 
+        when a catalog is configured)
+        In streaming mode, the walks are made by stream_files()
+        If candidates are provided, the search is refined by refine_files()
         """
-        if self.list_all:
+        if self.search_text and self.candidates is not None:
+            self.refine_files()
+        elif self.list_all and self.catalog_path:
+            self.list_catalog_files()
+        elif self.search_text and self.catalog_path:
+            self.search_index_files()
+        elif self.streaming and (self.list_all or self.search_text):
+            self.stream_files()
+        elif self.list_all:
             self.list_all_files()
         elif self.search_text:
             self.search_files()
@@ -106,6 +173,244 @@ class FileWorker(QThread):
         # Emit found files
         self.directory_files_found.emit(all_files)
 
+    def list_catalog_files(self):
+        """
+        Lists all files in the root directory and its subdirectories 
+        using the persistent catalog.
+        
+        Process:
+        1. Rescan the subtree, listing again only the directories whose 
+           mtime changed since the last scan
+        2. Synchronize the shared search index with the catalog
+        3. Read the file paths of the subtree from the catalog
+        4. Emit progress and file list via signals
+        
+        Emits:
+        - progress_updated: Progress percentage after each step
+        - directory_files_found: List of all found file paths
+        
+        In streaming mode, the file list is delivered through files_batch_found 
+        and scan_finished instead of directory_files_found.
+        """
+        all_files = []
+        try:
+            catalog = LibraryCatalog(self.catalog_path)
+            try:
+                catalog.rescan(self.root_dir, canceled=lambda: self.canceled, 
+                               check_sidecars=self.check_sidecars, check_files=self.check_files)
+                self.progress_updated.emit(50)
+                
+                # Mantém o índice de busca (e o filtro rápido) em dia com o catálogo
+                get_search_index(self.catalog_path).sync(catalog)
+                
+                all_files = catalog.list_records(self.root_dir)
+                self.progress_updated.emit(100)
+            finally:
+                catalog.close()
+        except sqlite3.OperationalError as e:
+            # Ex.: catálogo travado por outro processo; a lista fica vazia, mas termina
+            print(f"Erro ao ler o catálogo: {e}")
+        
+        if self.streaming:
+            for file_path, has_bib, ocr in all_files:
+                self._add_result((file_path, record_flags(has_bib, ocr)))
+            self._finish_stream()
+            return
+        
+        # Emit found files
+        self.directory_files_found.emit([record[0] for record in all_files])
+
+    def search_index_files(self):
+        """
+        Searches files in the root directory and its subdirectories using 
+        the inverted index of the catalog, without opening any .bib file.
+        
+        The search criteria are the same of search_files(), plus the 
+        field-scoped terms of query.parse_query (e.g. author:knuth 
+        year:>=2010 title:"logic"), evaluated against the parsed .bib 
+        fields stored in the index. The subtree is 
+        only scanned if it was never cataloged; otherwise the index reflects 
+        the last rescan (tree selection or Refresh). The index is synchronized 
+        with the changes of the catalog before the query.
+        
+        Emits:
+        - progress_updated: Progress percentage after each step
+        - search_complete: List of file paths matching search criteria 
+          (files_batch_found and scan_finished in streaming mode)
+        """
+        index = get_search_index(self.catalog_path)
+        try:
+            catalog = LibraryCatalog(self.catalog_path)
+            try:
+                if not catalog.has_directory(self.root_dir):
+                    catalog.rescan(self.root_dir, canceled=lambda: self.canceled)
+                self.progress_updated.emit(50)
+                index.sync(catalog)
+            finally:
+                catalog.close()
+        except sqlite3.OperationalError as e:
+            # A busca usa o índice como estava na última sincronização
+            print(f"Erro ao ler o catálogo: {e}")
+        
+        matching_files = [] if self.canceled else index.query(self.search_text, self.root_dir)
+        
+        if self.streaming:
+            for file_path in matching_files:
+                self._add_result((file_path, record_flags(*index.sidecar_state(file_path))))
+            self._finish_stream()
+            return
+        
+        self.progress_updated.emit(100)
+        self.search_complete.emit(matching_files)
+
+    def refine_files(self):
+        """
+        Evaluates search_text only against the results of a previous search 
+        (candidates), which are a superset of the new results when the 
+        previous query is contained in the new one.
+        
+        With a catalog, the candidates are checked against the texts of the 
+        search index; otherwise their .bib files are read.
+        
+        Emits:
+        - progress_updated: Progress percentage
+        - search_complete: List of file paths matching search criteria 
+          (files_batch_found and scan_finished in streaming mode)
+        """
+        if self.catalog_path:
+            index = get_search_index(self.catalog_path)
+            matching_files = index.query(self.search_text, self.root_dir, candidates=self.candidates)
+            records = [(file_path, record_flags(*index.sidecar_state(file_path)))
+                       for file_path in matching_files]
+        else:
+            records = []
+            for file_path in self.candidates:
+                if self.canceled:
+                    break
+                file = os.path.basename(file_path)
+                names = {file}
+                for ext in ('.bib', '.json'):
+                    if os.path.exists(file_path + ext):
+                        names.add(file + ext)
+                if self._matches(file, file_path, names):
+                    ocr = read_ocr(file_path + '.json') if file + '.json' in names else None
+                    records.append((file_path, record_flags(file + '.bib' in names, ocr)))
+        
+        if self.canceled:
+            records = []
+        
+        if self.streaming:
+            for record in records:
+                self._add_result(record)
+            self._finish_stream()
+            return
+        
+        self.progress_updated.emit(100)
+        self.search_complete.emit([record[0] for record in records])
+
+    def stream_files(self):
+        """
+        Lists or searches the files of the subtree in a single os.scandir pass.
+        
+        The progress is estimated from the number of files found in the last 
+        complete scan of the same root directory or, when it is unknown, from 
+        the number of directories visited and still pending.
+        
+        Search criteria (if search_text is set) are the same of search_files(); 
+        the sidecars are detected in the directory listing, without stat calls, 
+        and the .json sidecars of the found files are read here, off the GUI thread.
+        
+        Emits:
+        - progress_updated: Estimated progress percentage
+        - files_batch_found: Chunks of found file paths
+        - scan_finished: Number of found files
+        """
+        total_estimate = FileWorker.last_totals.get(self.root_dir, 0)
+        processed_files = 0
+        done_dirs = 0
+        stack = [self.root_dir]
+
+        while stack and not self.canceled:
+            dir_path = stack.pop()
+            files = []
+            names = set()
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            else:
+                                names.add(entry.name)
+                                if not (entry.name.endswith('.bib') or entry.name.endswith('.json')):
+                                    files.append(entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+            done_dirs += 1
+
+            for file in files:
+                if self.canceled:
+                    break
+                processed_files += 1
+                file_path = os.path.join(dir_path, file)
+                
+                if self.search_text is None or self._matches(file, file_path, names):
+                    ocr = read_ocr(file_path + '.json') if file + '.json' in names else None
+                    self._add_result((file_path, record_flags(file + '.bib' in names, ocr)))
+
+            if total_estimate > 0:
+                progress = min(99, int((processed_files / total_estimate) * 100))
+            else:
+                progress = int((done_dirs / (done_dirs + len(stack))) * 100)
+            self._update_progress(progress)
+            
+            if self._batch and time.monotonic() - self._batch_time >= self.BATCH_INTERVAL:
+                self._flush_batch()
+
+        if not self.canceled:
+            FileWorker.last_totals[self.root_dir] = processed_files
+        self._finish_stream()
+
+    def _matches(self, file, file_path, names):
+        """Search in filename and, if it doesn't match, in the .bib file."""
+        if self.search_text in file.lower():
+            return True
+        if file + '.bib' in names:
+            try:
+                with open(file_path + '.bib', 'r', encoding='utf-8') as f:
+                    return self.search_text in f.read().lower()
+            except:
+                pass
+        return False
+
+    def _add_result(self, record):
+        """Appends a (file_path, flags) record to the current batch and emits it when it is full or old."""
+        if not self._batch:
+            self._batch_time = time.monotonic()
+        self._batch.append(record)
+        self._found += 1
+        if len(self._batch) >= self.BATCH_SIZE or \
+           time.monotonic() - self._batch_time >= self.BATCH_INTERVAL:
+            self._flush_batch()
+
+    def _flush_batch(self):
+        if self._batch:
+            self.files_batch_found.emit(self._batch)
+            self._batch = []
+
+    def _update_progress(self, progress):
+        # Só emite quando o valor inteiro muda
+        if progress != self._progress:
+            self._progress = progress
+            self.progress_updated.emit(progress)
+
+    def _finish_stream(self):
+        self._flush_batch()
+        self._update_progress(100)
+        self.scan_finished.emit(self._found)
+
     def search_files(self):
         """
         Searches files in the root directory and its subdirectories.
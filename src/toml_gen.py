@@ -47,6 +47,7 @@ keywords = ["library", "management", "organizer"]
 dependencies = [
     "PyQt5",
     "PyPDF2",
+    "filetype",
     "scholarly"
 ]
 